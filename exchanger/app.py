@@ -6,6 +6,15 @@ from utils.set_bot_commands import set_default_commands
 from data.config import *
 from utils.middlware import *
 from check_env import check_environment_variables
+from utils.connection import close_all
+from utils.async_database import shutdown as shutdown_db_executor
+from utils.migrations import migrate
+from utils.database import DB
+from utils.broadcast import resume_jobs, registry
+from utils import analytics
+from utils.deal_events import deal_events
+from utils.callback_router import router
+import asyncio
 
 # Configure logging
 logging.basicConfig(
@@ -14,11 +23,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+#asyncio держит на задачи только слабые ссылки, без этого набора фоновая задача может пропасть посреди работы
+background_tasks = set()
+
+def background_done(task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed", exc_info=task.exception())
+
 async def on_startup(dispatcher):
     logger.info("Starting bot...")
     await set_default_commands(dispatcher)
+    #первая загрузка истории в колонки долгая, делаем ее в фоне, а не на первом открытии статистики
+    task = asyncio.create_task(analytics.query('totals'), name='analytics warm-up')
+    background_tasks.add(task)
+    task.add_done_callback(background_done)
+    resumed = await resume_jobs()
+    if resumed:
+        logger.info(f"Resumed {resumed} broadcast job(s)")
     logger.info("Bot started successfully!")
 
+async def on_shutdown(dispatcher):
+    for task in background_tasks:
+        task.cancel()
+    await registry.shutdown()
+    await deal_events.flush()
+    shutdown_db_executor()
+    close_all()
+
 #Разработчики: https://t.me/weaseldev @weaseldev
 
 if __name__ == '__main__':
@@ -28,14 +60,16 @@ if __name__ == '__main__':
         import sys
         sys.exit(1)
     
+    logger.info("Applying database migrations...")
+    logger.info(f"Database schema version: {migrate()}")
+    logger.info(f"Bot settings: {DB().reload_settings()}")
+
+    logger.info("Setting up callback routes...")
+    router.setup(dp)
+
     logger.info("Setting up middleware...")
-    dp.middleware.setup(OffCallback())
-    dp.middleware.setup(OffMessage())
-    dp.middleware.setup(SearchBanUserCallback())
-    dp.middleware.setup(Ads())
-    dp.middleware.setup(SubsribeOnChannelMessage())
-    dp.middleware.setup(SubsribeOnChannelCallback())
+    dp.middleware.setup(Gatekeeper())
     dp.middleware.setup(ThrottlingMiddleware())
     
     logger.info("Starting polling...")
-    executor.start_polling(dp, on_startup=on_startup)
+    executor.start_polling(dp, on_startup=on_startup, on_shutdown=on_shutdown)
@@ -0,0 +1,110 @@
+import asyncio
+import sys
+import time
+from aiogram import Dispatcher, types
+from aiogram.dispatcher.filters import check_filters, FilterNotPassed
+from aiogram.dispatcher.filters.builtin import StateFilter
+
+import handlers
+from data.config import ADMIN_ID
+from loader import dp
+from utils.callback_router import router
+
+
+#сколько стоит найти обработчик коллбека: перебор фильтров aiogram, как было до CallbackRouter, против одного разбора роутером
+#запуск: python bench_callbacks.py [раундов]
+
+
+def sample(route):
+
+    #callback_data и состояние, при которых должен сработать маршрут
+    data = route.key if route.exact else route.key + '1'
+    state = None if route.states == '*' else sorted(route.states, key=str)[0]
+    return data, state
+
+
+def callback(data, user_id):
+
+    return types.CallbackQuery(**{'id': '1', 'from': {'id': user_id, 'is_bot': False, 'first_name': 'bench'},
+                                  'chat_instance': '1', 'data': data,
+                                  'message': {'message_id': 1, 'date': 0, 'chat': {'id': user_id, 'type': 'private'}, 'text': 'bench'}})
+
+
+def linear_handlers():
+
+    #те же маршруты, зарегистрированные фильтрами aiogram в исходном порядке
+    linear = Dispatcher(dp.bot, storage=dp.storage)
+
+    for route in router.routes:
+        kwargs = {'text': route.key} if route.exact else {'text_startswith': route.key}
+        kwargs['state'] = '*' if route.states == '*' else list(route.states)
+
+        if route.user_ids is not None:
+            kwargs['user_id'] = list(route.user_ids)
+
+        linear.register_callback_query_handler(route.handler, **kwargs)
+
+    return linear.callback_query_handlers.handlers
+
+
+async def linear_resolve(linear, call):
+
+    for checked, handler in enumerate(linear, 1):
+        try:
+            await check_filters(handler.filters, (call,))
+            return handler.handler, checked
+
+        except FilterNotPassed:
+            continue
+
+    return None, len(linear)
+
+
+async def measure(resolve, samples, rounds):
+
+    start = time.perf_counter()
+
+    for _ in range(rounds):
+        for call, state in samples:
+            #состояние в обоих случаях уже прочитано, сравнивается только поиск обработчика
+            token = StateFilter.ctx_state.set(state)
+            await resolve(call)
+            StateFilter.ctx_state.reset(token)
+
+    return (time.perf_counter() - start) / (rounds * len(samples)) * 1e6
+
+
+async def main(rounds):
+
+    Dispatcher.set_current(dp)
+    types.User.set_current(types.User(id=ADMIN_ID[0], is_bot=False, first_name='bench'))
+    types.Chat.set_current(types.Chat(id=ADMIN_ID[0], type='private'))
+    router.dispatcher = router.dispatcher or dp
+
+    samples = [(callback(data, ADMIN_ID[0]), state) for data, state in map(sample, router.routes)]
+    linear = linear_handlers()
+
+    checked = []
+
+    for call, state in samples:
+        token = StateFilter.ctx_state.set(state)
+        handler, count = await linear_resolve(linear, call)
+        resolved = await router.resolve(call)
+        StateFilter.ctx_state.reset(token)
+
+        #на одном и том же наборе маршрутов оба способа должны находить один обработчик
+        if not resolved or resolved['route'].handler is not handler:
+            print(f'Расхождение для {call.data!r}: {handler} и {resolved}')
+
+        checked.append(count)
+
+    before = await measure(lambda call: linear_resolve(linear, call), samples, rounds)
+    after = await measure(router.resolve, samples, rounds)
+
+    print(f'Маршрутов: {len(router.routes)}, проверок фильтров на коллбек в среднем: {sum(checked) / len(checked):.1f}')
+    print(f'Перебор фильтров: {before:.1f} мкс на коллбек')
+    print(f'CallbackRouter:   {after:.1f} мкс на коллбек ({before / after:.1f}x)')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
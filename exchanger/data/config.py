@@ -10,6 +10,31 @@ ADMIN_ID = [int(id) for id in os.getenv('ADMIN_ID', '5938021235').split(',')] #
 ANKET_SEND = [int(id) for id in os.getenv('ANKET_SEND', '5938021235').split(',')] #айдишник, куда будут отсылаться заявки на обмен
 SUPPORT_LINK = os.getenv('SUPPORT_LINK', 'https://t.me/multi_coder') #ссылка на саппорта
 LINK_SUBSRIBE = os.getenv('LINK_SUBSRIBE', 'https://t.me/multi_coder')
+DB_PATH = os.getenv('DB_PATH', 'data/data.db') #путь к базе данных
+DB_READ_POOL = int(os.getenv('DB_READ_POOL', '4')) #сколько соединений на чтение держать открытыми
+DB_COMMIT_WINDOW_MS = float(os.getenv('DB_COMMIT_WINDOW_MS', '5')) #сколько мс копить записи в одну транзакцию
+DB_CACHE_KB = int(os.getenv('DB_CACHE_KB', '16384')) #размер кэша страниц sqlite на соединение
+TIMEZONE = os.getenv('TIMEZONE', 'Europe/Moscow') #часовой пояс, по которому считаются дни, недели и месяцы в статистике
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '50000')) #сколько пользователей держать в кэше бан/актив
+SUBSCRIBE_CACHE_TTL = int(os.getenv('SUBSCRIBE_CACHE_TTL', '300')) #сколько секунд верить, что юзер подписан на канал
+SUBSCRIBE_NEGATIVE_TTL = int(os.getenv('SUBSCRIBE_NEGATIVE_TTL', '15')) #сколько секунд помнить, что юзер не подписан
+REPORT_CACHE_SIZE = int(os.getenv('REPORT_CACHE_SIZE', '256')) #сколько разных отчетов /report держать в памяти до новой сделки
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', '5000')) #сколько строк читать из базы за раз при выгрузке в csv
+EXPORT_MAX_MB = int(os.getenv('EXPORT_MAX_MB', '49')) #больше телеграм не даст отправить ботом документом
+DEAL_EVENTS_BATCH = int(os.getenv('DEAL_EVENTS_BATCH', '50')) #сколько этапов сделок копить перед записью в базу
+DEAL_EVENTS_FLUSH_SECONDS = float(os.getenv('DEAL_EVENTS_FLUSH_SECONDS', '10')) #и не дольше стольких секунд
+DEAL_ID_BLOCK = int(os.getenv('DEAL_ID_BLOCK', '1000')) #сколько id заявок резервировать в базе за раз
+GATEKEEPER_CHECKS = os.getenv('GATEKEEPER_CHECKS', 'status,ban,seen,banner,subscription').split(',') #порядок проверок апдейта, дешевые первыми
+BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', '28')) #сообщений в секунду при рассылке, лимит телеграма ~30
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '20')) #сколько отправок рассылки держать в полете одновременно
+BROADCAST_CHECKPOINT_SECONDS = float(os.getenv('BROADCAST_CHECKPOINT_SECONDS', '5')) #как часто сохранять прогресс рассылки в базу
+BROADCAST_PROGRESS_SECONDS = float(os.getenv('BROADCAST_PROGRESS_SECONDS', '3')) #не чаще чем раз в столько секунд обновлять сообщение с прогрессом
+BROADCAST_RETRIES = int(os.getenv('BROADCAST_RETRIES', '3')) #сколько раз повторять отправку при флуд-контроле и сетевых ошибках
+BROADCAST_BACKOFF = float(os.getenv('BROADCAST_BACKOFF', '1')) #пауза перед первым повтором при сетевой ошибке, дальше удваивается
+BROADCAST_FLUSH_SIZE = int(os.getenv('BROADCAST_FLUSH_SIZE', '100')) #сколько заблокировавших бота копить перед записью в базу
+BROADCAST_PAGE_SIZE = int(os.getenv('BROADCAST_PAGE_SIZE', '1000')) #сколько получателей рассылки читать из базы за раз
+BROADCAST_RECENT_DAYS = int(os.getenv('BROADCAST_RECENT_DAYS', '30')) #сегмент рассылки "заходили недавно" - за сколько дней
+SEEN_RESOLUTION = int(os.getenv('SEEN_RESOLUTION', '86400')) #не чаще чем раз в столько секунд обновлять время последнего визита
 #faq должно быть не больше 4000 символов!
 FAQ = F'''
 Часто задаваемые вопросы:
@@ -1,9 +1,10 @@
 from aiogram import types
 from aiogram.types import *
-from aiogram.dispatcher.filters import Text
 from data.config import *
 from loader import dp, bot
-from utils.database import *
+from utils.callback_router import router
+from utils.async_database import *
+from utils import catalog, callback_codec
 from aiogram.dispatcher import FSMContext
 from keyboards import inline_keyboards as ikb
 from states.state import *
@@ -12,36 +13,35 @@ from states.state import *
 #здесь находится функционал удаления и добавления методов выплаты
 
 
-@dp.callback_query_handler(Text(startswith='dpayment_'), user_id = ADMIN_ID)
+@router.route(startswith='dpayment_', user_id=ADMIN_ID)
 async def del_payment_method(call: types.CallbackQuery):
 
     msg = call.data.replace('dpayment_', '')
 
-    with DB() as db:
-        req = db.give_payment_method(type=msg)
+    await call.message.edit_text(f'Нажмите на метод выплаты, который хотите удалить:', reply_markup=await catalog.keyboard('delete_payment', msg))
 
-    await call.message.edit_text(f'Нажмите на метод выплаты, который хотите удалить:', reply_markup=ikb.delet_payment_key(req))
 
-
-@dp.callback_query_handler(Text(startswith='methoddel_'), user_id = ADMIN_ID)
+@router.route(startswith=callback_codec.prefix('methoddel'), user_id=ADMIN_ID)
 async def delpay(call: types.CallbackQuery):
 
-    msg = call.data.split('_')
+    msg = await callback_codec.catalog_row(call)
+
+    if msg is None:
+        return
 
-    with DB() as db:
-        r = db.add_or_delet_payment_method(name=msg[2], type=msg[1], move='delete')
+    async with AsyncDB() as db:
+        r = await db.add_or_delet_payment_method(name=msg[0], type=msg[1], move='delete')
 
-    with DB() as db:
-        req = db.give_payment_method(type=msg[1])
+    req = await catalog.keyboard('delete_payment', msg[1])
 
     if r:
-        await call.message.edit_text(f'Нажмите на метод выплаты, который хотите удалить:', reply_markup=ikb.delet_payment_key(req))
+        await call.message.edit_text(f'Нажмите на метод выплаты, который хотите удалить:', reply_markup=req)
 
     else:
-        await call.message.edit_text(f'Произошла ошибка, не удалось удалить метод выплаты', reply_markup=ikb.delet_payment_key(req))
+        await call.message.edit_text(f'Произошла ошибка, не удалось удалить метод выплаты', reply_markup=req)
 
 
-@dp.callback_query_handler(Text(startswith='payment_'), user_id = ADMIN_ID)
+@router.route(startswith='payment_', user_id=ADMIN_ID)
 async def add_payment_method(call: types.CallbackQuery, state: FSMContext):
 
     msg = call.data.replace('payment_', '')
@@ -72,9 +72,9 @@ async def add_method_to_dp(msg: types.Message, state: FSMContext):
 
     await state.finish()
 
-    with DB() as db:
+    async with AsyncDB() as db:
         for name in message:
-            req = db.add_or_delet_payment_method(name=name, type=type_, move='add')
+            req = await db.add_or_delet_payment_method(name=name, type=type_, move='add')
 
             if req:
                 pass
@@ -1,9 +1,9 @@
 from aiogram import types
 from aiogram.types import *
-from aiogram.dispatcher.filters import Text
 from data.config import *
 from loader import dp, bot
-from utils.database import *
+from utils.callback_router import router
+from utils.async_database import *
 from aiogram.dispatcher import FSMContext
 from keyboards import inline_keyboards as ikb
 from states.state import *
@@ -12,7 +12,7 @@ from states.state import *
 #здесь находится функционал добавленя валют
 
 
-@dp.callback_query_handler(Text(startswith='add_'))
+@router.route(startswith='add_')
 async def add_valute(call: types.CallbackQuery, state: FSMContext):
 
     type_ = call.data
@@ -35,12 +35,6 @@ async def add_valute(call: types.CallbackQuery, state: FSMContext):
                         'RUB 1000 15000 5536914000336929', reply_markup=ikb.admin_menu)
 
 
-@dp.callback_query_handler(Text(startswith='back_to_admin'))
-async def back_to_admin_func(call: types.CallbackQuery):
-
-    await call.message.edit_text('💻 Главное меню панели администратора:', reply_markup=ikb.admin_panel_key)
-
-
 @dp.message_handler(state=AddValute.log)
 async def add_valute_to_db(msg: types.Message, state: FSMContext):
 
@@ -53,8 +47,8 @@ async def add_valute_to_db(msg: types.Message, state: FSMContext):
     await state.finish()
 
     if len(message) == 4:        
-        with DB() as db:
-            req = db.add_valute(valute=message[0], type=type_valute, min=message[1], max=message[2], requisite=message[3])
+        async with AsyncDB() as db:
+            req = await db.add_valute(valute=message[0], type=type_valute, min=message[1], max=message[2], requisite=message[3])
 
         if req:
             await msg.answer('✅ Валюта успешно добавлена в базу', reply_markup=ikb.admin_panel_key)
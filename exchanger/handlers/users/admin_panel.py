@@ -2,8 +2,13 @@ from aiogram import types
 from aiogram.types import *
 from data.config import *
 from loader import dp, bot
-from utils.database import *
+from utils.callback_router import router
+from utils.async_database import *
+from utils.cache import user_status, channel_list
 from utils.statistic_func import *
+from utils import export, analytics
+from utils.deal_events import deal_events, percentile
+import os
 from keyboards import inline_keyboards as ikb
 from aiogram.dispatcher import FSMContext
 from states.state import *
@@ -19,74 +24,174 @@ async def admin_panel(msg: types.Message):
 	await msg.answer('Добро пожаловать в панель администратора!', reply_markup=ikb.admin_panel_key)
 
 
-@dp.callback_query_handler(user_id = ADMIN_ID, text_startswith='aspam')
+@dp.message_handler(user_id = ADMIN_ID, commands=['reload'])
+async def reload_settings(msg: types.Message):
+
+	#после ручной правки data.db: перечитать статус бота, баннер и сбросить кэш пользователей и каналов
+	async with AsyncDB() as db:
+		r = await db.reload_settings()
+
+	#счетчики кэша с запуска бота - по ним подбирается USER_CACHE_SIZE
+	cache = user_status.stats()
+	user_status.invalidate()
+	channel_list.invalidate()
+
+	await msg.answer(f'♻️ Настройки перечитаны из базы\nСтатус бота: {r.status}\nБаннер: {"есть" if r.banner else "нет"}\n'
+					f'Кэш пользователей: {cache["size"]} записей, {cache["hits"]} попаданий, {cache["misses"]} промахов ({cache["hit_rate"]:.0%})',
+					reply_markup=ikb.admin_panel_key)
+
+
+@dp.message_handler(user_id = ADMIN_ID, commands=['report'])
+async def report_func(msg: types.Message):
+
+	try:
+		start, end, valute, user = parse_report_args(msg.get_args())
+
+	except ValueError as e:
+		await msg.answer(f'⚠️ {e}\n\n{REPORT_USAGE}')
+		return
+
+	async with AsyncDB() as db:
+		report = await db.history_report(start, end, valute=valute, user=user)
+
+	await msg.answer(report_text(report, start, end, valute=valute, user=user), reply_markup=ikb.close_key)
+
+
+async def send_export(msg, path, filename, fits):
+
+	try:
+		if fits:
+			await msg.answer_document(InputFile(path, filename=filename))
+
+		else:
+			await msg.answer('⚠️ Файл больше, чем телеграм разрешает отправить ботом. Сузьте период или добавьте gz')
+
+	finally:
+		os.remove(path)
+
+
+@dp.message_handler(user_id = ADMIN_ID, commands=['export_history'])
+async def export_history_func(msg: types.Message):
+
+	#/export_history [2024-01-01 [2024-01-31]] [valute=BTC] [user=123] [gz]
+	args = msg.get_args().split()
+	gz = 'gz' in args
+	args = ' '.join(arg for arg in args if arg != 'gz')
+
+	try:
+		start, end, valute, user = parse_report_args(args, require_dates=False)
+
+	except ValueError as e:
+		await msg.answer(f'⚠️ {e}\n\nИспользование:\n/export_history [2024-01-01 [2024-01-31]] [valute=BTC] [user=123456] [gz]')
+		return
+
+	await msg.answer('🕠 Готовлю выгрузку истории...')
+	await send_export(msg, *await export.export_history(start, end, valute=valute, user=user, gz=gz))
+
+
+@dp.message_handler(user_id = ADMIN_ID, commands=['export_users'])
+async def export_users_func(msg: types.Message):
+
+	await msg.answer('🕠 Готовлю выгрузку пользователей...')
+	await send_export(msg, *await export.export_users(gz='gz' in msg.get_args().split()))
+
+
+@dp.message_handler(user_id = ADMIN_ID, commands=['deal_times'])
+async def deal_times_func(msg: types.Message):
+
+	#/deal_times [дней, по умолчанию 30]
+	args = msg.get_args().strip()
+	days = int(args) if args.isdigit() else 30
+
+	durations = await deal_events.durations(days)
+
+	await msg.answer(deal_times_text(durations, days, percentile), reply_markup=ikb.close_key)
+
+
+@router.route(text='analytics', user_id=ADMIN_ID)
+async def analytics_func(call: types.CallbackQuery):
+
+	weekday = await analytics.query('by_weekday')
+	daily = await analytics.query('daily', days=7)
+	top = await analytics.query('top_users', limit=5)
+
+	await call.message.edit_text(analytics_text(weekday, daily, top), reply_markup=ikb.stat_back)
+
+
+@dp.message_handler(user_id = ADMIN_ID, commands=['export_analytics'])
+async def export_analytics_func(msg: types.Message):
+
+	#/export_analytics daily|pairs|weekday|users [gz]
+	args = msg.get_args().split()
+	kind = next((arg for arg in args if arg != 'gz'), 'daily')
+
+	if kind not in ('daily', 'pairs', 'weekday', 'users'):
+		await msg.answer('Использование:\n/export_analytics daily|pairs|weekday|users [gz]')
+		return
+
+	await msg.answer('🕠 Готовлю выгрузку аналитики...')
+	await send_export(msg, *await export.export_analytics(kind, gz='gz' in args))
+
+
+@router.route(startswith='aspam', user_id=ADMIN_ID)
 async def aspam_func(call: types.CallbackQuery):
 
 	await call.message.edit_text('Выберите вид рассылки\nС медиафайлами значит можно прикреплять гифки и фотографии', reply_markup=ikb.spam_key)
 
 
-@dp.callback_query_handler(user_id = ADMIN_ID, text_startswith='time_')
+@router.route(startswith='time_', user_id=ADMIN_ID)
 async def time_func(call: types.CallbackQuery):
 
 	msg = call.data.replace('time_', '')
 
-	with DB() as db:
-		db_list = db.give_custom_history_db()
+	async with AsyncDB() as db:
+		profit_list = await db.give_profit_by_exchange(granularity=msg, start=current_period(msg))
 
-	ret = custom_stat_func(db_list, time=msg)
+	ret = custom_stat_func(profit_list, time=msg)
 
 	await call.message.edit_text(ret, reply_markup=ikb.stat_back)
 
 
-@dp.callback_query_handler(user_id = ADMIN_ID, text_startswith='statistic')
+@router.route(startswith='statistic', user_id=ADMIN_ID)
 async def statistic_func(call: types.CallbackQuery):
 
-	with DB() as db:
-		db_list = db.give_custom_history_db()
-
-	with DB() as db:
-		users = db.stat_user()
+	async with AsyncDB() as db:
+		total, active, banned = await db.give_user_counters()
 
-	activee = []
-	noactive = []
-
-	for i in users:
-		if i[1] == '1':
-			activee.append('1')
-		else:
-			noactive.append('0')
+	profit_list = [(name, profit) for name, profit, deals in await analytics.query('totals')]
 
-	a = all_stat(db_list)
+	a = all_stat(profit_list)
 
 	text = f'''
-Всего юзеров: {len(users)}
-Активных: {len(activee)}
-Неактив: {len(noactive)}
+Всего юзеров: {total}
+Активных: {active}
+Неактив: {total - active}
+Забанено: {banned}
 {a}'''
 	
 	await call.message.edit_text(text, reply_markup=ikb.stat_time)
 
 
 
-@dp.callback_query_handler(user_id = ADMIN_ID, text_startswith='status')
+@router.route(startswith='status', user_id=ADMIN_ID)
 async def bot_func(call: types.CallbackQuery):
 
-	with DB() as db:
-		r = db.give_status_bot()
+	async with AsyncDB() as db:
+		r = await db.give_status_bot()
 
 	await call.message.edit_text('В этом разделе вы можете выключить или включить бота по кнопке ниже', reply_markup=ikb.status_bot(status=r[0][1]))
 
 
-@dp.callback_query_handler(user_id = ADMIN_ID, text_startswith='sbot_')
+@router.route(startswith='sbot_', user_id=ADMIN_ID)
 async def sbot_func(call: types.CallbackQuery):
 
 	msg = call.data.replace('sbot_', '')
 
-	with DB() as db:
-		r = db.on_off_bot(status=msg)
+	async with AsyncDB() as db:
+		r = await db.on_off_bot(status=msg)
 
-	with DB() as db:
-		rr = db.give_status_bot()
+	async with AsyncDB() as db:
+		rr = await db.give_status_bot()
 
 	if r:
 		await call.message.edit_text('✅ Статус бота изменен', reply_markup=ikb.status_bot(status=rr[0][1])) 
@@ -95,7 +200,7 @@ async def sbot_func(call: types.CallbackQuery):
 		await call.message.edit_text('❗️ Что то пошло не так, статус бота остался прежним', reply_markup=ikb.status_bot(status=rr[0][1])) 
 
 
-@dp.callback_query_handler(user_id = ADMIN_ID, text_startswith='adbanner')
+@router.route(startswith='adbanner', user_id=ADMIN_ID)
 async def banner_func(call: types.CallbackQuery):
 
 	if call.data == 'adbanner_true':
@@ -104,8 +209,8 @@ async def banner_func(call: types.CallbackQuery):
 		await call.message.edit_text('Введите текст до 190 символов', reply_markup=ikb.admin_menu)
 
 	else:		
-		with DB() as db:
-			r = db.move_banner(move='delete', text='false')
+		async with AsyncDB() as db:
+			r = await db.move_banner(move='delete', text='false')
 
 		if r:
 			await call.answer('✅ Баннер удален из базы.')
@@ -125,8 +230,8 @@ async def delete_channel(msg: types.Message, state = FSMContext):
 		await msg.answer(f'В вашем тексте: {len(text)} символов, допустимое значение 190 символов, попробуйте снова.', reply_markup=ikb.admin_panel_key)
 
 	else:
-		with DB() as db:
-			r = db.move_banner(move='add', text=text)
+		async with AsyncDB() as db:
+			r = await db.move_banner(move='add', text=text)
 
 		if r:
 			await msg.answer('✅ Баннер добавлен в базу', reply_markup=ikb.admin_panel_key)
@@ -135,7 +240,7 @@ async def delete_channel(msg: types.Message, state = FSMContext):
 			await msg.answer('❕ Что то пошло не так...\nЕсли вы пытались удалить баннер проверьте, существует он или нет\nЕсли вы пытались добавить баннер то, скорее всего, он уже добавлен. Удалите старый баннер что бы добавить новый', reply_markup=ikb.admin_panel_key)
 
 
-@dp.callback_query_handler(user_id = ADMIN_ID, text_startswith='antiban')
+@router.route(startswith='antiban', user_id=ADMIN_ID)
 async def antiban_func(call: types.CallbackQuery):
 
 	await AntiBan.antiban_id.set()
@@ -143,7 +248,7 @@ async def antiban_func(call: types.CallbackQuery):
 	await call.message.edit_text('Введите id юзера, которого хотите разбанить', reply_markup=ikb.admin_menu)
 
 
-@dp.callback_query_handler(user_id = ADMIN_ID, text_startswith='channel')
+@router.route(startswith='channel', user_id=ADMIN_ID)
 async def channel_func(call: types.CallbackQuery, state: FSMContext):	
 
 	if call.data == 'channel_add':
@@ -164,8 +269,8 @@ async def delete_channel(msg: types.Message, state = FSMContext):
 
 	await state.finish()
 
-	with DB() as db:
-		r = db.delete_channel(id=text)
+	async with AsyncDB() as db:
+		r = await db.delete_channel(id=text)
 
 	if r:
 		await msg.answer('👍 Канал успешно удален из базы данных.')
@@ -183,8 +288,8 @@ async def set_channel(msg: types.Message, state = FSMContext):
 
 	text = text.split(' ')
 
-	with DB() as db:
-		r = db.add_channel(id_channel=text[0], url=text[1])
+	async with AsyncDB() as db:
+		r = await db.add_channel(id_channel=text[0], url=text[1])
 
 	if r:
 		await msg.answer('👍 Канал успешно добавле в базу данных.')
@@ -193,7 +298,7 @@ async def set_channel(msg: types.Message, state = FSMContext):
 		await msg.answer('❕ Канал не был добвален в базу данных, что то пошло не так...')
 
 
-@dp.callback_query_handler(user_id = ADMIN_ID, text_startswith='ban_user')
+@router.route(startswith='ban_user', user_id=ADMIN_ID)
 async def statsric_func(call: types.CallbackQuery, state: FSMContext):
 
 	await Ban.ban_id.set()
@@ -208,8 +313,8 @@ async def ban_user(msg: types.Message, state: FSMContext):
 
 	await state.finish()
 
-	with DB() as db:
-		req = db.ban_user(id=message)
+	async with AsyncDB() as db:
+		req = await db.ban_user(id=message)
 
 	if req:
 		await msg.answer(f'Пользователь успешно забанен!', reply_markup=ikb.admin_panel_key)
@@ -225,8 +330,8 @@ async def anti_ban_user(msg: types.Message, state: FSMContext):
 
 	await state.finish()
 
-	with DB() as db:
-		req = db.anti_ban_user_to_db(id=message)
+	async with AsyncDB() as db:
+		req = await db.anti_ban_user_to_db(id=message)
 
 	if req:
 		await msg.answer(f'Пользователь успешно разбанен!', reply_markup=ikb.admin_panel_key)
@@ -2,8 +2,8 @@ from aiogram import types
 from aiogram.types import *
 from data.config import *
 from loader import dp, bot
+from utils.callback_router import router
 from keyboards import inline_keyboards as ikb
-from aiogram.dispatcher.filters import Text
 from states.state import *
 from aiogram.dispatcher import FSMContext
 from utils.middlware import *
@@ -12,13 +12,13 @@ from utils.middlware import *
 #обработка коллбеков
 
 
-@dp.callback_query_handler(text_startswith='close')
+@router.route(startswith='close')
 async def close_message(call: types.CallbackQuery):
 
     await call.message.delete()
 
 
-@dp.callback_query_handler(text_startswith="profile")
+@router.route(startswith="profile")
 async def profile_handler(call: types.CallbackQuery):
 
     await bot.answer_callback_query(call.id)
@@ -27,25 +27,19 @@ async def profile_handler(call: types.CallbackQuery):
                                reply_markup=ikb.back_to_menu)
 
 
-@dp.callback_query_handler(text_startswith="menu")
-async def profile_handler(call: types.CallbackQuery):
-
-    await call.message.edit_text('Добро пожаловать в обменник!', reply_markup=ikb.main_menu_inline)
-
-
-@dp.callback_query_handler(text_startswith="faq")
+@router.route(startswith="faq")
 async def faq_handler(call: types.CallbackQuery):
 
     await call.message.edit_text(FAQ, reply_markup=ikb.back_to_menu)
 
 
-@dp.callback_query_handler(text_startswith="exchange")
+@router.route(startswith="exchange")
 async def exchange_handler(call: types.CallbackQuery):
 
     await call.message.edit_text('Какой обмен нужно совершить?', reply_markup=ikb.exchange_valute)
 
 
-@dp.callback_query_handler(Text(startswith='back_to_admin'), state="*")
+@router.route(startswith='back_to_admin', state="*")
 async def back_to_admin_func(call: types.CallbackQuery, state: FSMContext):
 
     try:
@@ -57,9 +51,14 @@ async def back_to_admin_func(call: types.CallbackQuery, state: FSMContext):
         await bot.send_message(call.from_user.id, '💻 Главное меню панели администратора:', reply_markup=ikb.admin_panel_key)
 
 
-@dp.callback_query_handler(Text(startswith='menu'), state="*")
+@router.route(startswith='menu', state="*")
 async def back_to_menu_user(call: types.CallbackQuery, state: FSMContext):
 
+    #из главного меню просто возвращаемся в него, из середины сценария - сбрасываем состояние
+    if await state.get_state() is None:
+        await call.message.edit_text('Добро пожаловать в обменник!', reply_markup=ikb.main_menu_inline)
+        return
+
     await state.finish()
 
     await call.message.edit_text('Вы были перенаправлены в главное меню', reply_markup=ikb.main_menu_inline)
@@ -3,7 +3,7 @@ from aiogram.types import *
 from data.config import *
 from loader import dp, bot
 from keyboards import inline_keyboards as ikb
-from utils.database import *
+from utils.async_database import *
 from utils.middlware import *
 
 
@@ -14,7 +14,7 @@ async def start(message: types.Message):
     name_user = message.from_user.full_name
     username = message.from_user.username
 
-    with DB() as db:
-        db.add_user(id, name_user, username)
+    async with AsyncDB() as db:
+        await db.add_user(id, name_user, username)
 
     await message.answer('Добро пожаловать в обменник!', reply_markup=ikb.main_menu_inline)
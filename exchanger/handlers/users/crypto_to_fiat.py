@@ -2,47 +2,49 @@ from aiogram import types
 from aiogram.types import *
 from data.config import *
 from loader import dp, bot
+from utils.callback_router import router
 from keyboards import inline_keyboards as ikb
-from utils.database import *
+from utils.async_database import *
+from utils import applications
+from utils import catalog, callback_codec
 from states.state import *
 from aiogram.dispatcher import FSMContext
-from aiogram.dispatcher.filters import Text
 
 
 #обмен крипты на фиат
 
 
-@dp.callback_query_handler(text_startswith="crypto_to_fiat")
+@router.route(startswith="crypto_to_fiat")
 async def fiat_to_crypto_handler(call: types.CallbackQuery):
-    
-    with DB() as db:
-        list_key = db.give_keyboard_valute(type_valute='crypto')
 
     await Exchange.valute_exhcnage.set()
 
-    await call.message.edit_text(f'Выберите криптовалюту, которую Вы хотите обменять', reply_markup=ikb.exchange_user(valute_list=list_key, type_='crypto'))
+    await call.message.edit_text(f'Выберите криптовалюту, которую Вы хотите обменять', reply_markup=await catalog.keyboard('exchange', 'crypto'))
 
 
-@dp.callback_query_handler(Text(startswith='exchange_'), state = Exchange.valute_exhcnage)
+@router.route(startswith=callback_codec.prefix('exchange'), state=Exchange.valute_exhcnage)
 async def set_excahnge(call: types.CallbackQuery, state: FSMContext):
 
-    msg = call.data.replace('exchange_', '')
+    msg = await callback_codec.catalog_name(call)
+
+    if msg is None:
+        return
 
     async with state.proxy() as data:
         data['valute_exhcnage'] = msg
 
-    with DB() as db:
-        list_key = db.give_keyboard_valute(type_valute='fiat')
-
     await Exchange.valute_issue.set()
 
-    await call.message.edit_text(f'Выберите валюту, которую Вы хотите получить', reply_markup=ikb.exchange_user(valute_list=list_key, type_='fiat'))
+    await call.message.edit_text(f'Выберите валюту, которую Вы хотите получить', reply_markup=await catalog.keyboard('exchange', 'fiat'))
     
 
-@dp.callback_query_handler(Text(startswith='exchange_'), state = Exchange.valute_issue)
+@router.route(startswith=callback_codec.prefix('exchange'), state=Exchange.valute_issue)
 async def set_issue(call: types.CallbackQuery, state: FSMContext):
 
-    msg = call.data.replace('exchange_', '')
+    msg = await callback_codec.catalog_name(call)
+
+    if msg is None:
+        return
 
     async with state.proxy() as data:
         data['valute_issue'] = msg
@@ -50,16 +52,16 @@ async def set_issue(call: types.CallbackQuery, state: FSMContext):
 
     await Exchange.payment_method.set()
 
-    with DB() as db:
-        req = db.give_payment_method(type='crypto')
+    await call.message.edit_text(f'Выберите метод выплаты:', reply_markup=await catalog.keyboard('payment', 'crypto'))
 
-    await call.message.edit_text(f'Выберите метод выплаты:', reply_markup=ikb.give_payment_method_key(type_=req))
 
-
-@dp.callback_query_handler(Text(startswith='pmethod_'), state = Exchange.payment_method)
+@router.route(startswith=callback_codec.prefix('pmethod'), state=Exchange.payment_method)
 async def set_issue(call: types.CallbackQuery, state: FSMContext):
 
-    msg = call.data.replace('pmethod_', '')
+    msg = await callback_codec.catalog_name(call)
+
+    if msg is None:
+        return
 
     async with state.proxy() as data:
         data['payment_method'] = msg
@@ -67,8 +69,7 @@ async def set_issue(call: types.CallbackQuery, state: FSMContext):
 
     await Exchange.amount.set()
 
-    with DB() as db:
-        req = db.give_min_and_max(name=name)
+    req = await catalog.min_and_max(name=name)
 
     await call.message.edit_text(f'Минимальная сумма для обмена {name}: {req[0][0]}\n'
                                 f'Максимальная сумма для обмена {name}: {req[0][1]}\n'
@@ -89,8 +90,7 @@ async def set_issue(message: types.Message, state: FSMContext):
     async with state.proxy() as data:
         name = data['valute_exhcnage']
 
-    with DB() as db:
-        req = db.give_min_and_max(name=name)
+    req = await catalog.min_and_max(name=name)
 
     try:
         amount = float(msg)
@@ -175,7 +175,7 @@ async def set_comment(message: types.Message, state: FSMContext):
     await message.answer(application, reply_markup=ikb.send_admin_key)
         
     
-@dp.callback_query_handler(Text(startswith='asend'), state = Exchange.send_to_false)
+@router.route(startswith='asend', state=Exchange.send_to_false)
 async def set_send_to_false(call: types.CallbackQuery, state: FSMContext):
 
     id = call.from_user.id
@@ -192,6 +192,8 @@ async def set_send_to_false(call: types.CallbackQuery, state: FSMContext):
 
     await call.message.edit_text('✅ Вашая заявка отправлена на рассмотрение, ожидайте отклика администрации.', reply_markup=ikb.main_menu_inline)
 
+    app_id = await applications.create(call.from_user, valute_exhcnage, valute_issue, payment_method, amount, requisites, comment)
+
     for id_ in ANKET_SEND:
         text = f'''
 Поступила новая заявка:
@@ -206,4 +208,4 @@ async def set_send_to_false(call: types.CallbackQuery, state: FSMContext):
 💳 Реквизиты: {requisites}
 ✉️ Комментарий: {comment}'''
 
-        await bot.send_message(id_, text, reply_markup=ikb.anket_user(id=id, exchange=f'{valute_exhcnage}_{valute_issue}', amount=amount))
\ No newline at end of file
+        await bot.send_message(id_, text, reply_markup=ikb.anket_user(app_id))
\ No newline at end of file
@@ -1,8 +1,9 @@
 from aiogram.types import *
-from aiogram.dispatcher.filters import Text
 from data.config import *
 from loader import dp, bot
-from utils.database import *
+from utils.callback_router import router
+from utils.async_database import *
+from utils import catalog, callback_codec
 from keyboards import inline_keyboards as ikb
 from states.state import *
 
@@ -10,31 +11,28 @@ from states.state import *
 #удаление валют
 
 
-@dp.callback_query_handler(Text(startswith='delet_'))
+@router.route(startswith='delet_')
 async def delet_v(call: CallbackQuery):
 
     msg = call.data.replace('delet_', '')
   
-    with DB() as db:
-        req = db.give_keyboard_valute(type_valute=msg)
+    await call.message.edit_text(f'Нажмите на валюту для ее удаления', reply_markup=await catalog.keyboard('delete_valute', msg))
 
-    await call.message.edit_text(f'Нажмите на валюту для ее удаления', reply_markup=ikb.delet_valute_key(valute_list=req))
 
-
-@dp.callback_query_handler(Text(startswith='vdelet_'))
+@router.route(startswith=callback_codec.prefix('vdelet'))
 async def delete_valute_to_db(call: CallbackQuery):
 
-    msg = call.data.split('_')
-    
-    with DB() as db:
-        req = db.delete_valute(name=msg[1])
+    msg = await callback_codec.catalog_row(call)
 
-    if req:
+    if msg is None:
+        return
 
-        with DB() as db:
-            req = db.give_keyboard_valute(type_valute=msg[2])
+    async with AsyncDB() as db:
+        req = await db.delete_valute(name=msg[0])
+
+    if req:
 
-        await call.message.edit_text('Валюта удалена, если хотите удалить еще так же нажмиет на соответствующую кнопку', reply_markup=ikb.delet_valute_key(valute_list=req))
+        await call.message.edit_text('Валюта удалена, если хотите удалить еще так же нажмиет на соответствующую кнопку', reply_markup=await catalog.keyboard('delete_valute', msg[1]))
 
     else:
 
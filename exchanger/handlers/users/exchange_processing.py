@@ -2,67 +2,81 @@ from aiogram import types
 from aiogram.types import *
 from data.config import *
 from loader import dp, bot
+from utils.callback_router import router
 from keyboards import inline_keyboards as ikb
-from utils.database import *
+from utils.async_database import *
+from utils import applications, callback_codec
 from states.state import *
-from aiogram.dispatcher.filters import Text
-from datetime import date
 
 
-#процесс обмена
+#процесс обмена: в кнопках только действие и id заявки, все остальное берется из таблицы applications
+#id заявок идут подряд и callback_data можно подделать, поэтому шаги админа закрыты по user_id
 
 
-@dp.callback_query_handler(Text(startswith='anket_'))
+async def take_application(call, user_id=None):
+
+    #меняет статус заявки по кнопке, None - кнопка старого формата или заявку уже обработали
+    parsed = applications.parse(call.data)
+
+    if parsed is None:
+        await call.answer('Заявка устарела', show_alert=True)
+        return None
+
+    app = await applications.transition(*parsed, user_id=user_id)
+
+    if app is None:
+        await call.answer('Заявка уже обработана', show_alert=True)
+
+    return app
+
+
+@router.route(startswith=[callback_codec.prefix('anket'), callback_codec.prefix('anket_false')], user_id=ANKET_SEND + ADMIN_ID)
 async def set_anket(call: types.CallbackQuery):
 
-    msg = call.data
-    msg_text = call.message.text.split('\n')
+    app = await take_application(call)
 
-    if 'anket_false' in msg:
-        await call.message.edit_text(f'Вы отклонили заявку от пользователя:\n'
-                                f'{msg_text[2]}\n{msg_text[3]}\n{msg_text[4]}\n\n'
-                                f'{msg_text[9]}\n'
-                                f'{msg_text[8]}', reply_markup=ikb.close_key)
+    if app is None:
+        return
 
-        msg = msg.split('_')
+    if app.status == 'rejected':
+        await call.message.edit_text(f'Вы отклонили заявку от пользователя:\n'
+                                f'{applications.summary(app)}', reply_markup=ikb.close_key)
 
         text = f'''
-😔 Ваша заявка обмена {msg[5]} {msg[3]} на {msg[4]} была отклонена.'''
+😔 Ваша заявка обмена {app.amount} {app.valute_from} на {app.valute_to} была отклонена.'''
 
-        await bot.send_message(int(msg[2]), text, reply_markup=ikb.close_key)
+        await bot.send_message(app.user_id, text, reply_markup=ikb.close_key)
 
     else:
         await call.message.edit_text(f'Вы одобрили заявку от пользователя:\n'
-                                f'{msg_text[2]}\n{msg_text[3]}\n{msg_text[4]}\n\n'
-                                f'{msg_text[9]}\n'
-                                f'{msg_text[8]}', reply_markup=ikb.close_key)
-
-        msg = msg.split('_')
+                                f'{applications.summary(app)}', reply_markup=ikb.close_key)
 
-        with DB() as db:
-            req = db.give_info_valute(name=f'{msg[2]}')
+        async with AsyncDB() as db:
+            req = await db.give_info_valute(name=app.valute_from)
 
-        exchange = f'{msg[2]}_{msg[3]}'
-
-        await bot.send_message(int(msg[1]), f'🔄 Ваша заявка обмена <code>{msg[2]}</code> на <code>{msg[3]}</code> была одобрена, переведите <code>{msg[4]}</code> {msg[2]} на следущий адрес:\n'
+        await bot.send_message(app.user_id, f'🔄 Ваша заявка обмена <code>{app.valute_from}</code> на <code>{app.valute_to}</code> была одобрена, переведите <code>{app.amount}</code> {app.valute_from} на следущий адрес:\n'
                                         f'<code>{str(req[0][0])}</code>\n'
-                                        f'После перевода средств нажмите на кнопку ниже', reply_markup=ikb.anket_step_two(exchange, amount=msg[4]))
+                                        f'После перевода средств нажмите на кнопку ниже', reply_markup=ikb.anket_step_two(app.id))
 
 
-@dp.callback_query_handler(Text(startswith='usanket_'))
+@router.route(startswith=[callback_codec.prefix('usanket_true'), callback_codec.prefix('usanket_false')])
 async def true_anket(call: types.CallbackQuery):
 
-    msg = call.data.split('_')
+    #перевести заявку может только ее владелец
+    app = await take_application(call, user_id=call.from_user.id)
+
+    if app is None:
+        return
 
-    if msg[1] == 'false':
+    if app.status == 'user_cancelled':
         await call.message.edit_text('Вы отменили сделку', reply_markup=ikb.close_key)
 
         for i in ADMIN_ID:
             await bot.send_message(int(i), '❕ Уведомоение\n\n'
                                             '😕 Пользователь отменил сделку:\n'
-                                            f'🆔: <code>{call.from_user.id}</code>\n'
-                                            f'👾 Username: @{call.from_user.username}\n'
-                                            f'👤 Имя: <code>{call.from_user.full_name}</code>\n\n', reply_markup=ikb.close_key)
+                                            f'🆔: <code>{app.user_id}</code>\n'
+                                            f'👾 Username: @{app.username}\n'
+                                            f'👤 Имя: <code>{app.full_name}</code>\n\n', reply_markup=ikb.close_key)
 
     else:
         await call.message.edit_text('Ожидайте поступление средств, в случае чего можно связаться с саппортом по кнопке ниже', reply_markup=ikb.supprot_key)
@@ -71,40 +85,45 @@ async def true_anket(call: types.CallbackQuery):
 
             text = f'''
 Пользователь подтверил перевод средств:
-🆔: <code>{call.from_user.id}</code>
-👾 Username: @{call.from_user.username}
-👤 Имя: <code>{call.from_user.full_name}</code>
-Обмен {msg[4]} {msg[2]} на {msg[3]}
+🆔: <code>{app.user_id}</code>
+👾 Username: @{app.username}
+👤 Имя: <code>{app.full_name}</code>
+Обмен {app.amount} {app.valute_from} на {app.valute_to}
 '''
 
-            await bot.send_message(int(id_), text, reply_markup=ikb.confirm_exchange(id=call.from_user.id, exchange=f'{msg[2]}_{msg[3]}', amount=f'{msg[4]}'))
+            await bot.send_message(int(id_), text, reply_markup=ikb.confirm_exchange(app.id))
 
 
-@dp.callback_query_handler(Text(startswith='confirm_'))
+@router.route(startswith=[callback_codec.prefix('confirm_good'), callback_codec.prefix('confirm_false')], user_id=ANKET_SEND + ADMIN_ID)
 async def confirm_anket(call: types.CallbackQuery):
 
-    msg = call.data.split('_')
+    app = await take_application(call)
 
-    if msg[1] == 'false':
+    if app is None:
+        return
+
+    if app.status == 'cancelled':
         await call.message.edit_text('⁉️ Вы отменили обмен, пользователю было отправлено сообщение о том, что нужно обратиться к саппорту что бы вернуть сердства.', reply_markup=ikb.close_key)
 
-        await bot.send_message(int(msg[2]), f'❓ По каким то причинам Ваш обмен {msg[3]} {msg[4]} на {msg[5]} был отменен, напишите саппорту проекта для возврата средств', reply_markup=ikb.supprot_key)
+        await bot.send_message(app.user_id, f'❓ По каким то причинам Ваш обмен {app.amount} {app.valute_from} на {app.valute_to} был отменен, напишите саппорту проекта для возврата средств', reply_markup=ikb.supprot_key)
 
     else:
         await call.message.edit_text('✅ Сделка завершена, пользователь был уведомлен.', reply_markup=ikb.close_key)
 
-        await bot.send_message(int(msg[2]), '🎉 Администратор отправил средства на ваши реквизиты', reply_markup=ikb.close_key)
-
-        dt_now = date.today()
+        await bot.send_message(app.user_id, '🎉 Администратор отправил средства на ваши реквизиты', reply_markup=ikb.close_key)
 
-        with DB() as db:
-            a = db.add_history(amount=msg[3], id=msg[2], name_exchange=msg[4])
+        async with AsyncDB() as db:
+            a = await db.add_history(amount=app.amount, id=app.user_id, name_exchange=app.valute_from)
 
         if a:
             await call.message.edit_text('✅ Сделка завершена, пользователь был уведомлен, сделка занесена в базу данных.', reply_markup=ikb.close_key)
-        
+
         else:
             await call.message.edit_text('✅ Сделка завершена, пользователь был уведомлен, но по каким то причинам сделка не была занесена в базу данных.', reply_markup=ikb.close_key)
 
 
+@router.route(startswith=['anket', 'usanket', 'confirm'])
+async def old_anket(call: types.CallbackQuery):
 
+    #кнопки, отправленные до перехода на callback_codec
+    await take_application(call)
@@ -2,18 +2,16 @@ from aiogram import types
 from aiogram.types import *
 from data.config import *
 from loader import dp, bot
-from utils.database import *
+from utils.callback_router import router
+from utils.async_database import *
 from keyboards import inline_keyboards as ikb
 from aiogram.dispatcher import FSMContext
 from states.state import *
+from utils.broadcast import BroadcastJob, registry, progress_text
 
 
 
-#функция рассылки
-
-
-
-@dp.callback_query_handler(user_id = ADMIN_ID, text_startswith='spam_')
+@router.route(startswith='spam_', user_id=ADMIN_ID)
 async def time_func(call: types.CallbackQuery):
 
     msg = call.data.replace('spam_', '')
@@ -55,42 +53,20 @@ async def set_text_media(msg: types.Message, state: FSMContext):
     await msg.answer_photo(photo=id_photo, caption=f'Ваш пост выглядит так:\n{text}\nНачать рассылку?', reply_markup=ikb.go_spam)
 
 
-@dp.callback_query_handler(user_id = ADMIN_ID, text_startswith='ps_go', state=SpamMedia.send)
+@router.route(startswith='ps_go', state=SpamMedia.send, user_id=ADMIN_ID)
 async def time_func(call: types.CallbackQuery, state: FSMContext):
 
-    await call.message.edit_caption('🕠 Ожидайте окончания рассылки, Вам придет отчет', reply_markup=ikb.close_key)
-
     async with state.proxy() as data:
         text = data['text']
         file_id = data['file_id']
 
     await state.finish()
 
-    with DB() as db:
-        ids = db.give_id_user()
-
-    good = 0
-    false = 0
-    for id_ in ids:
+    job = await BroadcastJob.create(kind='photo', text=text, file_id=file_id, admin_id=call.from_user.id, segment=call.data.replace('ps_go_', ''))
 
+    await call.message.edit_caption(f'🕠 Рассылка #{job.id} запущена, прогресс будет в следующем сообщении')
 
-        try:
-            await bot.send_photo(int(id_[0]), photo=file_id, caption=text) 
-            good += 1
-        except Exception as e:
-        
-            with DB() as db:
-                a = db.unable_user(id_[0])
-            false +=1
-
-    ot = f'''
-📊 Отчет о рассылке:
-
-👥 Всего людей в базе: {len(ids)}
-👤 Активных: {good}
-👤 Неактивных: {false}'''
-
-    await bot.send_message(call.from_user.id, ot, reply_markup=ikb.admin_panel_key)
+    registry.spawn(job)
 
 
 @dp.message_handler(user_id = ADMIN_ID, state = Spam.text)
@@ -105,38 +81,49 @@ async def set_text(msg: types.Message, state: FSMContext):
                     f'{msg.html_text}', reply_markup=ikb.go_spam)
 
 
-@dp.callback_query_handler(user_id = ADMIN_ID, text_startswith='ps_go', state=Spam.send)
+@router.route(startswith='ps_go', state=Spam.send, user_id=ADMIN_ID)
 async def time_func(call: types.CallbackQuery, state: FSMContext):
 
-    await call.message.edit_text('🕠 Ожидайте окончания рассылки, Вам придет отчет', reply_markup=ikb.close_key)
-
     async with state.proxy() as data:
         text = data['text']
 
     await state.finish()
 
-    with DB() as db:
-        ids = db.give_id_user()
+    job = await BroadcastJob.create(kind='text', text=text, file_id=None, admin_id=call.from_user.id, segment=call.data.replace('ps_go_', ''))
+
+    await call.message.edit_text(f'🕠 Рассылка #{job.id} запущена, прогресс будет в следующем сообщении')
+
+    registry.spawn(job)
+
+
+@router.route(startswith='bjob_', user_id=ADMIN_ID)
+async def broadcast_job_control(call: types.CallbackQuery):
+
+    action, id = call.data.replace('bjob_', '').split('_')
+    status = {'pause': 'paused', 'resume': 'running', 'cancel': 'cancelled'}[action]
+
+    async with AsyncDB() as db:
+        changed = await db.set_broadcast_status(id=id, status=status)
+
+    job = registry.get(id)
+
+    if not changed or job is None:
+        await call.answer('Рассылка уже завершена', show_alert=True)
+        return
+
+    getattr(job, action)()
+
+    await job.show_progress()
+    await call.answer({'pause': 'Рассылка на паузе', 'resume': 'Рассылка продолжается', 'cancel': 'Рассылка остановлена'}[action])
 
-    good = 0
-    false = 0
-    for id_ in ids:
 
-        try:
-            await bot.send_message(int(id_[0]), text) 
-            good += 1
-        except Exception as e:
-        
-            with DB() as db:
-                db.unable_user(id_[0])
-            false +=1
+@router.route(text='bjobs', user_id=ADMIN_ID)
+async def broadcast_jobs_list(call: types.CallbackQuery):
 
-    ot = f'''
-📊 Отчет о рассылке:
+    running = registry.running()
 
-👥 Всего людей в базе: {len(ids)}
-👤 Активных: {good}
-👤 Неактивных: {false}'''
+    if not running:
+        await call.message.edit_text('Сейчас рассылок нет', reply_markup=ikb.admin_menu)
+        return
 
-    await bot.send_message(call.from_user.id, ot, reply_markup=ikb.close_key)
-            
\ No newline at end of file
+    await call.message.edit_text('\n\n'.join(progress_text(job) for job in running), reply_markup=ikb.admin_menu)
@@ -2,18 +2,19 @@ from aiogram import types
 from aiogram.types import *
 from data.config import *
 from loader import dp, bot
+from utils.callback_router import router
 from keyboards import inline_keyboards as ikb
-from utils.database import *
+from utils.async_database import *
 from states.state import *
 
 
 
 
-@dp.callback_query_handler(user_id = ADMIN_ID, text_startswith='statsric')
+@router.route(startswith='statsric', user_id=ADMIN_ID)
 async def stat_func(call: types.CallbackQuery):
 
-    with DB() as db:
-        req = db.give_stat_admin()
+    async with AsyncDB() as db:
+        req = await db.give_stat_admin()
 
     valute = []
 
@@ -1,6 +1,7 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from data.config import *
 from aiogram.types.web_app_info import WebAppInfo
+from utils import callback_codec
 
 main_menu_inline = InlineKeyboardMarkup()
 main_menu_inline.row(InlineKeyboardButton('👤 Профиль', callback_data='profile'),
@@ -19,6 +20,7 @@ stat_time = InlineKeyboardMarkup()
 stat_time.row(InlineKeyboardButton('🕐 За день', callback_data='time_day'))
 stat_time.row(InlineKeyboardButton('🕒 За неделю', callback_data='time_week'))
 stat_time.row(InlineKeyboardButton('🕕 За месяц', callback_data='time_month'))
+stat_time.row(InlineKeyboardButton('🧮 Аналитика', callback_data='analytics'))
 stat_time.row(InlineKeyboardButton('⬅️ Назад', callback_data='back_to_admin'))
 
 
@@ -50,6 +52,7 @@ admin_panel_key.row(InlineKeyboardButton('♻️ Разбанить', callback_d
                     InlineKeyboardButton('📛 Выдать бан', callback_data=f'ban_user'))
 admin_panel_key.row(InlineKeyboardButton('📊 Статистика', callback_data='statistic'),
                     InlineKeyboardButton('📣 Расылка', callback_data='aspam'))
+admin_panel_key.row(InlineKeyboardButton('📋 Идущие рассылки', callback_data='bjobs'))
 admin_panel_key.row(InlineKeyboardButton('➕ Привязать канал', callback_data='channel_add'),
                     InlineKeyboardButton('➖ Отвязать канал', callback_data='channel_delet'))
 admin_panel_key.row(InlineKeyboardButton('➕ Добавить рекламу', callback_data=f'adbanner_true'),
@@ -89,13 +92,29 @@ spam_key_two.row(InlineKeyboardButton('⬅️ Назад', callback_data='back_t
 
 
 go_spam = InlineKeyboardMarkup()
-go_spam.row(InlineKeyboardButton('✅ Начать', callback_data='ps_go'))
+go_spam.row(InlineKeyboardButton('✅ Всем', callback_data='ps_go_all'))
+go_spam.row(InlineKeyboardButton('💱 Только со сделками', callback_data='ps_go_deals'))
+go_spam.row(InlineKeyboardButton(f'🕐 Заходили за {BROADCAST_RECENT_DAYS} дн.', callback_data=f'ps_go_recent_{BROADCAST_RECENT_DAYS}'))
 go_spam.row(InlineKeyboardButton('❌ Отмена', callback_data='back_to_admin'))
 
 admin_menu = InlineKeyboardMarkup()
 admin_menu.row(InlineKeyboardButton('⬅️ Назад', callback_data='back_to_admin'))
 
 
+def broadcast_job_key(id, status='running'):
+
+    job_key = InlineKeyboardMarkup()
+
+    if status == 'paused':
+        job_key.row(InlineKeyboardButton('▶️ Продолжить', callback_data=f'bjob_resume_{id}'),
+                    InlineKeyboardButton('⏹ Отменить', callback_data=f'bjob_cancel_{id}'))
+    else:
+        job_key.row(InlineKeyboardButton('⏸ Пауза', callback_data=f'bjob_pause_{id}'),
+                    InlineKeyboardButton('⏹ Отменить', callback_data=f'bjob_cancel_{id}'))
+
+    return job_key
+
+
 def delet_payment_key(payment_list):
 
     delet_payment = InlineKeyboardMarkup()
@@ -105,7 +124,7 @@ def delet_payment_key(payment_list):
         name = log[0]
         type_ = log[1]
 
-        delet_payment.row(InlineKeyboardButton(f'{name}', callback_data=f'methoddel_{type_}_{name}'))
+        delet_payment.row(InlineKeyboardButton(f'{name}', callback_data=callback_codec.encode('methoddel', log[-1])))
     delet_payment.row(InlineKeyboardButton('⬅️ Назад', callback_data='back_to_admin'))
     return delet_payment
 
@@ -121,7 +140,7 @@ def delet_valute_key(valute_list):
         name = log[0]
         type_ = log[1]
 
-        delet_valute.row(InlineKeyboardButton(f'{name}', callback_data=f'vdelet_{name}_{type_}'))
+        delet_valute.row(InlineKeyboardButton(f'{name}', callback_data=callback_codec.encode('vdelet', log[-1])))
     delet_valute.row(InlineKeyboardButton('⬅️ Назад', callback_data='back_to_admin'))
 
     return delet_valute
@@ -138,7 +157,7 @@ def exchange_user(valute_list, type_):
 
             if log[1] == 'crypto':
 
-                exchange_user_key.row(InlineKeyboardButton(log[0], callback_data=f'exchange_{log[0]}'))
+                exchange_user_key.row(InlineKeyboardButton(log[0], callback_data=callback_codec.encode('exchange', log[-1])))
             else:
                 pass
 
@@ -148,7 +167,7 @@ def exchange_user(valute_list, type_):
 
             if log[1] == 'fiat':
 
-                exchange_user_key.row(InlineKeyboardButton(log[0], callback_data=f'exchange_{log[0]}'))
+                exchange_user_key.row(InlineKeyboardButton(log[0], callback_data=callback_codec.encode('exchange', log[-1])))
             else:
                 pass
     exchange_user_key.row(InlineKeyboardButton('⏪ Назад', callback_data=f'menu'))
@@ -165,7 +184,7 @@ def give_payment_method_key(type_):
         name = log[0]
         type_ = log[1]
 
-        key_payment.row(InlineKeyboardButton(f'{name}', callback_data=f'pmethod_{name}'))
+        key_payment.row(InlineKeyboardButton(f'{name}', callback_data=callback_codec.encode('pmethod', log[-1])))
     key_payment.row(InlineKeyboardButton('⬅️ Назад', callback_data='menu'))
     return key_payment
 
@@ -176,26 +195,26 @@ send_admin_key.row(InlineKeyboardButton('↗️ Отправить', callback_da
                 InlineKeyboardButton('↩️ Отмена', callback_data='menu'))
 
 
-def anket_user(id, exchange, amount):
+def anket_user(app_id):
 
     user_anket_key = InlineKeyboardMarkup()
-    user_anket_key.row(InlineKeyboardButton('✅ Принять', callback_data=f'anket_{id}_{exchange}_{amount}'),
-                    InlineKeyboardButton('❌ Отклонить', callback_data=f'anket_false_{id}_{exchange}_{amount}'))
+    user_anket_key.row(InlineKeyboardButton('✅ Принять', callback_data=callback_codec.encode('anket', app_id)),
+                    InlineKeyboardButton('❌ Отклонить', callback_data=callback_codec.encode('anket_false', app_id)))
     return user_anket_key
     
 #Разработчики: https://t.me/weaseldev @weaseldev
 
-def anket_step_two(exchange, amount):
+def anket_step_two(app_id):
 
     anket_user_key = InlineKeyboardMarkup()
-    anket_user_key.row(InlineKeyboardButton('✅ Перевел', callback_data=f'usanket_true_{exchange}_{amount}'),
-                        InlineKeyboardButton('❌ Отменить обмен', callback_data=f'usanket_false_{exchange}_{amount}'))
+    anket_user_key.row(InlineKeyboardButton('✅ Перевел', callback_data=callback_codec.encode('usanket_true', app_id)),
+                        InlineKeyboardButton('❌ Отменить обмен', callback_data=callback_codec.encode('usanket_false', app_id)))
     return anket_user_key
     
 
-def confirm_exchange(id, exchange, amount):
+def confirm_exchange(app_id):
 
     confirm_key = InlineKeyboardMarkup()
-    confirm_key.row(InlineKeyboardButton('Закончить обмен', callback_data=f'confirm_good_{id}_{amount}_{exchange}'))
-    confirm_key.row(InlineKeyboardButton('Отменить обмен', callback_data=f'confirm_false_{id}_{amount}_{exchange}'))
+    confirm_key.row(InlineKeyboardButton('Закончить обмен', callback_data=callback_codec.encode('confirm_good', app_id)))
+    confirm_key.row(InlineKeyboardButton('Отменить обмен', callback_data=callback_codec.encode('confirm_false', app_id)))
     return confirm_key
\ No newline at end of file
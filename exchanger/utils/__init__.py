@@ -1,4 +1,11 @@
+from . import cache
+from . import connection
 from . import database
+from . import async_database
+from . import migrations
 from . import set_bot_commands
 from . import middlware
-from . import statistic_func
\ No newline at end of file
+from . import statistic_func
+from . import catalog
+from . import analytics
+from . import export
\ No newline at end of file
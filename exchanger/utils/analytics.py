@@ -0,0 +1,261 @@
+import threading
+import numpy as np
+from datetime import date, datetime, timedelta
+from utils.async_database import AsyncDB
+from utils.statistic_func import TZ
+
+
+#история сделок в памяти колонками numpy: группировки считаются векторно, а не циклом по строкам
+
+WEEKDAYS = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+
+#1970-01-01 был четвергом
+EPOCH_WEEKDAY = 3
+
+
+class Dictionary(object):
+    """
+    Кодирует значения (названия обменов, id пользователей) в номера 0..n-1.
+    """
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, values):
+
+        codes = np.empty(len(values), dtype=np.int32)
+
+        for i, value in enumerate(values):
+            code = self._codes.get(value)
+
+            if code is None:
+                code = self._codes[value] = len(self.values)
+                self.values.append(value)
+
+            codes[i] = code
+
+        return codes
+
+    def code(self, value):
+        return self._codes.get(value)
+
+
+class HistoryStore(object):
+    """
+    Колонки: ts (unix time), day (номер дня по TIMEZONE), amount, exchange и user (коды словарей).
+    refresh() дочитывает только строки с rowid больше последнего загруженного.
+    """
+
+    def __init__(self, tz=TZ):
+        self.tz = tz
+        self.rowid = 0
+        self.size = 0
+        self.exchanges = Dictionary()
+        self.users = Dictionary()
+        self._columns = {
+            'ts': np.empty(0, dtype=np.int64),
+            'day': np.empty(0, dtype=np.int32),
+            'amount': np.empty(0, dtype=np.float64),
+            'exchange': np.empty(0, dtype=np.int32),
+            'user': np.empty(0, dtype=np.int32),
+        }
+        self._days = {}
+        self._lock = threading.RLock()
+
+    def column(self, name):
+        return self._columns[name][:self.size]
+
+    def refresh(self, db, chunk=50000):
+
+        #история только дописывается, поэтому rowid годится как отметка "до сюда уже загружено"
+        with self._lock:
+            rows = db.iterate('SELECT rowid, data, amount, exchange, id FROM history WHERE rowid > ? ORDER BY rowid', [self.rowid])
+            batch = []
+
+            for row in rows:
+                batch.append(row)
+
+                if len(batch) >= chunk:
+                    self._append(batch)
+                    batch = []
+
+            if batch:
+                self._append(batch)
+
+            return self.size
+
+    def _append(self, batch):
+
+        rowid, ts, amount, exchange, user = zip(*batch)
+        ts = np.fromiter(ts, dtype=np.int64, count=len(batch))
+
+        new = {
+            'ts': ts,
+            'day': self._local_days(ts),
+            'amount': np.fromiter((float(a or 0) for a in amount), dtype=np.float64, count=len(batch)),
+            'exchange': self.exchanges.encode(exchange),
+            'user': self.users.encode(user),
+        }
+
+        end = self.size + len(batch)
+
+        for name, values in new.items():
+            column = self._columns[name]
+
+            #растим с запасом, чтобы дописывание было амортизированно O(1)
+            if end > len(column):
+                grown = np.empty(max(end, len(column) * 2, 1024), dtype=column.dtype)
+                grown[:self.size] = column[:self.size]
+                self._columns[name] = column = grown
+
+            column[self.size:end] = values
+
+        self.size = end
+        self.rowid = rowid[-1]
+
+    def _local_days(self, ts):
+
+        #смещение часового пояса кратно 15 минутам, так что дата считается один раз на 15-минутку
+        buckets, inverse = np.unique(ts // 900, return_inverse=True)
+        days = np.empty(len(buckets), dtype=np.int32)
+
+        for i, bucket in enumerate(buckets.tolist()):
+            day = self._days.get(bucket)
+
+            if day is None:
+                day = self._days[bucket] = datetime.fromtimestamp(bucket * 900, self.tz).date().toordinal() - date(1970, 1, 1).toordinal()
+
+            days[i] = day
+
+        return days[inverse]
+
+    def query(self, db, name, *args, **kwargs):
+
+        #вызывается в потоке базы: дочитать новое и посчитать под одной блокировкой
+        with self._lock:
+            self.refresh(db)
+            return getattr(self, name)(*args, **kwargs)
+
+    def _mask(self, start=None, end=None, pair=None, user=None):
+
+        mask = np.ones(self.size, dtype=bool)
+        ts = self.column('ts')
+
+        if start is not None:
+            mask &= (ts >= start) & (ts < end)
+
+        if pair is not None:
+            mask &= self.column('exchange') == self.exchanges.code(pair)
+
+        if user is not None:
+            mask &= self.column('user') == self.users.code(int(user))
+
+        return mask
+
+    def totals(self, start=None, end=None, pair=None, user=None):
+
+        #[(обмен, сумма, сделок), ...] по названию обмена, обмены без сделок тоже попадают с нулем
+        mask = self._mask(start, end, pair, user)
+        codes = self.column('exchange')[mask]
+        n = len(self.exchanges)
+
+        amount = np.bincount(codes, weights=self.column('amount')[mask], minlength=n)
+        deals = np.bincount(codes, minlength=n)
+
+        return sorted((name, float(amount[i]), int(deals[i])) for i, name in enumerate(self.exchanges.values))
+
+    def by_weekday(self):
+
+        #{обмен: [сумма за Пн, ..., Вс]}
+        n = len(self.exchanges)
+        weekday = (self.column('day') + EPOCH_WEEKDAY) % 7
+        sums = np.bincount(self.column('exchange') * 7 + weekday, weights=self.column('amount'), minlength=n * 7).reshape(n, 7)
+
+        return {name: sums[i].tolist() for i, name in sorted(enumerate(self.exchanges.values), key=lambda log: log[1])}
+
+    def daily(self, days=None, window=7):
+
+        #[(дата, сумма за день, сумма за window дней по этот день включительно), ...] подряд без пропусков
+        if not self.size:
+            return []
+
+        day = self.column('day')
+        first, last = int(day.min()), int(day.max())
+
+        sums = np.bincount(day - first, weights=self.column('amount'), minlength=last - first + 1)
+        cumulative = np.concatenate(([0.0], np.cumsum(sums)))
+        rolling = cumulative[1:] - cumulative[np.maximum(np.arange(1, len(sums) + 1) - window, 0)]
+
+        epoch = date(1970, 1, 1)
+        rows = [(epoch + timedelta(days=first + i), float(sums[i]), float(rolling[i])) for i in range(len(sums))]
+
+        return rows if days is None else rows[-days:]
+
+    def daily_by_exchange(self):
+
+        #[(дата, обмен, сумма, сделок), ...] только дни, где по обмену были сделки
+        if not self.size:
+            return []
+
+        day = self.column('day')
+        first = int(day.min())
+        n = len(self.exchanges)
+        key = (day - first).astype(np.int64) * n + self.column('exchange')
+
+        amount = np.bincount(key, weights=self.column('amount'))
+        deals = np.bincount(key)
+        epoch = date(1970, 1, 1)
+
+        return [(epoch + timedelta(days=first + int(k) // n), self.exchanges.values[int(k) % n], float(amount[k]), int(deals[k]))
+                for k in np.flatnonzero(deals)]
+
+    def top_users(self, limit=10):
+
+        #[(id пользователя, оборот, сделок), ...] по убыванию оборота
+        codes = self.column('user')
+        n = len(self.users)
+
+        turnover = np.bincount(codes, weights=self.column('amount'), minlength=n)
+        deals = np.bincount(codes, minlength=n)
+        top = np.argsort(turnover)[::-1][:limit]
+
+        return [(self.users.values[i], float(turnover[i]), int(deals[i])) for i in top.tolist()]
+
+
+store = HistoryStore()
+
+
+async def query(name, *args, **kwargs):
+
+    async with AsyncDB() as db:
+        return await db.run(store.query, db.db, name, *args, **kwargs)
+
+
+def rows(db, kind):
+
+    #строки csv для /export_analytics
+    if kind == 'daily':
+        yield ['date', 'amount', 'rolling_7d']
+        for day, amount, rolling in store.query(db, 'daily'):
+            yield [day.isoformat(), amount, rolling]
+
+    elif kind == 'pairs':
+        yield ['date', 'exchange', 'amount', 'deals']
+        for day, exchange, amount, deals in store.query(db, 'daily_by_exchange'):
+            yield [day.isoformat(), exchange, amount, deals]
+
+    elif kind == 'weekday':
+        yield ['exchange', *WEEKDAYS]
+        for exchange, sums in store.query(db, 'by_weekday').items():
+            yield [exchange, *sums]
+
+    elif kind == 'users':
+        yield ['user_id', 'turnover', 'deals']
+        yield from store.query(db, 'top_users', limit=None)
+
+    else:
+        raise ValueError(f'Неизвестная выгрузка: {kind}')
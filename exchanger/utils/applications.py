@@ -0,0 +1,68 @@
+from collections import namedtuple
+from utils.async_database import AsyncDB
+from utils.deal_events import deal_events
+from utils import callback_codec
+
+
+#заявки на обмен: все данные лежат в таблице applications, в кнопках только действие и id (utils/callback_codec.py)
+
+Application = namedtuple('Application', ['id', 'user_id', 'username', 'full_name', 'valute_from', 'valute_to',
+                                        'payment_method', 'amount', 'requisites', 'comment', 'status', 'created', 'updated'])
+
+#действие кнопки -> (из какого статуса, в какой), он же этап в deal_events
+TRANSITIONS = {
+    'anket': ('submitted', 'approved'),
+    'anket_false': ('submitted', 'rejected'),
+    'usanket_true': ('approved', 'paid'),
+    'usanket_false': ('approved', 'user_cancelled'),
+    'confirm_good': ('paid', 'completed'),
+    'confirm_false': ('paid', 'cancelled'),
+}
+
+
+def parse(data):
+
+    #'ar:16' -> ('anket_false', 42), кнопки старого формата -> None
+    unpacked = callback_codec.unpack(data)
+
+    if unpacked is None or unpacked[0] not in TRANSITIONS:
+        return None
+
+    return unpacked[0], unpacked[1][0]
+
+
+async def create(user, valute_from, valute_to, payment_method, amount, requisites, comment):
+
+    app_id = await deal_events.next_id()
+
+    async with AsyncDB() as db:
+        await db.create_application(app_id, user.id, user.username, user.full_name, valute_from, valute_to,
+                                    payment_method, amount, requisites, comment)
+
+    await deal_events.record(app_id, 'submitted', f'{valute_from}_{valute_to}')
+    return app_id
+
+
+async def transition(action, app_id, user_id=None):
+
+    #Application после смены статуса или None, если заявку уже перевели дальше (повторный клик, другой админ)
+    status_from, status_to = TRANSITIONS[action]
+
+    async with AsyncDB() as db:
+        row = await db.transition_application(app_id, status_from, status_to, user_id=user_id)
+
+    if row is None:
+        return None
+
+    app = Application(*row)
+    await deal_events.record(app.id, status_to, f'{app.valute_from}_{app.valute_to}')
+    return app
+
+
+def summary(app):
+
+    return (f'🆔: <code>{app.user_id}</code>\n'
+            f'👾 Username: @{app.username}\n'
+            f'👤 Имя: <code>{app.full_name}</code>\n\n'
+            f'💰 Колличестов {app.valute_from}: {app.amount}\n'
+            f'💸 Выплатить на {app.payment_method}')
@@ -0,0 +1,135 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from data.config import DB_PATH, DB_READ_POOL, BROADCAST_PAGE_SIZE
+from utils.database import DB
+from utils.cache import user_status, NOT_CACHED, bot_settings, catalog_cache, channel_list, report_cache
+
+
+#асинхронная обертка над DB: запросы выполняются в отдельных потоках и не блокируют event loop
+
+#по потоку на каждое соединение на чтение + один под запись
+executor = ThreadPoolExecutor(max_workers=DB_READ_POOL + 1, thread_name_prefix='db')
+
+
+class AsyncDB(object):
+    """
+    Те же методы, что и у DB, только их нужно await'ить:
+
+    async with AsyncDB() as db:
+        r = await db.search_ban_user(id=user_id)
+    """
+
+    def __init__(self, db_fp=DB_PATH):
+        self.db = DB(db_fp)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        pass
+
+    async def run(self, func, *args, **kwargs):
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    async def commit(self, sql, params=()):
+
+        #запись без занятия потока из пула: просто ждем коммита групповой транзакции
+        return await asyncio.wrap_future(self.db.submit(sql, params))
+
+    async def user_flags(self, id):
+
+        #попадание в кэш отвечаем сразу, без похода в поток с базой
+        flags = user_status.get(int(id))
+
+        if flags is NOT_CACHED:
+            flags = await self.run(self.db.load_user_flags, id)
+
+        return flags
+
+    async def touch_user(self, id):
+
+        self.db.touch_user(id)
+
+    async def recipients(self, segment='all', after=0, page=BROADCAST_PAGE_SIZE):
+
+        #получатели рассылки по возрастанию id, в памяти не больше одной страницы
+        while True:
+            rows = await self.run(self.db.give_recipients_page, after, page, segment)
+
+            for row in rows:
+                yield row[0]
+
+            if len(rows) < page:
+                return
+
+            after = rows[-1][0]
+
+    async def search_ban_user(self, id):
+
+        flags = await self.user_flags(id)
+        return None if flags is None else (int(flags.banned),)
+
+    async def settings(self):
+
+        snapshot = bot_settings.get()
+
+        if snapshot is None:
+            snapshot = await self.run(self.db.reload_settings)
+
+        return snapshot
+
+    async def give_status_bot(self):
+
+        return [('1', (await self.settings()).status)]
+
+    async def give_banner(self):
+
+        banner = (await self.settings()).banner
+        return [] if banner is None else [('1', banner)]
+
+    async def catalog(self):
+
+        data = catalog_cache.get()
+
+        if data is None:
+            data = await self.run(self.db.catalog)
+
+        return data
+
+    async def give_list_channel(self):
+
+        req = channel_list.get()
+
+        if req is None:
+            req = await self.run(self.db.give_list_channel)
+
+        return req
+
+    async def history_report(self, start, end, valute=None, user=None):
+
+        report = report_cache.get((int(start), int(end), valute, user))
+
+        if report is None:
+            report = await self.run(self.db.history_report, start, end, valute, user)
+
+        return report
+
+    def __getattr__(self, name):
+
+        method = getattr(self.db, name)
+
+        if not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+
+        return wrapper
+
+
+def shutdown():
+    executor.shutdown(wait=True)
@@ -0,0 +1,503 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from aiogram.utils import exceptions
+from data.config import BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_CHECKPOINT_SECONDS, BROADCAST_PROGRESS_SECONDS, BROADCAST_RETRIES, BROADCAST_BACKOFF, BROADCAST_FLUSH_SIZE
+from loader import bot
+from keyboards import inline_keyboards as ikb
+from utils.async_database import AsyncDB
+
+
+#движок рассылки: общий лимит сообщений в секунду + несколько отправок одновременно
+
+logger = logging.getLogger(__name__)
+
+#пользователь недоступен насовсем - повторять бессмысленно, помечаем неактивным
+PERMANENT_ERRORS = (
+    exceptions.BotBlocked,
+    exceptions.UserDeactivated,
+    exceptions.ChatNotFound,
+    exceptions.CantInitiateConversation,
+    exceptions.CantTalkWithBots,
+)
+
+#временные сбои сети или телеграма - стоит повторить
+TRANSIENT_ERRORS = (
+    exceptions.NetworkError,
+    exceptions.RestartingTelegram,
+    asyncio.TimeoutError,
+)
+
+
+def is_permanent(error):
+    return isinstance(error, PERMANENT_ERRORS)
+
+
+class TokenBucket(object):
+    """
+    rate токенов в секунду, не больше capacity про запас.
+    """
+
+    def __init__(self, rate=BROADCAST_RATE, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._held_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def hold(self, seconds):
+
+        #телеграм попросил подождать - лимит общий на бота, так что тормозим все отправки
+        self._held_until = max(self._held_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+
+                if now < self._held_until:
+                    await asyncio.sleep(self._held_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+#один бакет на процесс: лимит телеграма общий для всех рассылок бота
+bucket = TokenBucket()
+
+
+class BroadcastStats(object):
+
+    def __init__(self, total=0, sent=0, failed=0, cursor=0, deactivated=0):
+        self.total = total
+        self.sent = sent
+        self.failed = failed
+        #часть failed: пользователь заблокировал бота или удалил аккаунт
+        self.deactivated = deactivated
+        self.retries = 0
+        #id, до которого включительно все отправки завершены
+        self.cursor = cursor
+        self.started = time.monotonic()
+        self.finished = None
+        self._done_before = sent + failed
+
+    @property
+    def done(self):
+        return self.sent + self.failed
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rate(self):
+        #скорость считаем только по отправкам этого запуска
+        return (self.done - self._done_before) / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def remaining(self):
+        return max(self.total - self.done, 0)
+
+    @property
+    def eta(self):
+        #секунд до конца при текущей скорости, None - пока считать не по чему
+        return self.remaining / self.rate if self.rate > 0 else None
+
+
+class Broadcaster(object):
+    """
+    send(user_id) - корутина отправки одному пользователю,
+    on_error(user_id, exception) - вызывается, если отправка не удалась и после повторов,
+    gate() - ждет, пока можно продолжать, и возвращает False, если рассылку надо остановить,
+    on_checkpoint(stats) - периодически сохраняет прогресс.
+    user_ids - список или асинхронный итератор, id должны идти по возрастанию, чтобы stats.cursor можно было использовать для продолжения.
+    """
+
+    def __init__(self, send, on_error=None, gate=None, on_checkpoint=None,
+                concurrency=BROADCAST_CONCURRENCY, bucket=bucket, checkpoint_every=BROADCAST_CHECKPOINT_SECONDS,
+                retries=BROADCAST_RETRIES, backoff=BROADCAST_BACKOFF):
+        self.send = send
+        self.on_error = on_error
+        self.gate = gate
+        self.on_checkpoint = on_checkpoint
+        self.concurrency = concurrency
+        self.bucket = bucket
+        self.checkpoint_every = checkpoint_every
+        self.retries = retries
+        self.backoff = backoff
+        #отправки текущего запуска в порядке старта: [user_id, завершена ли]
+        self.pending = deque()
+
+    async def run(self, user_ids, stats=None):
+
+        stats = stats or BroadcastStats()
+        window = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        pending = self.pending = deque()
+        ticker = None
+
+        if self.on_checkpoint is not None:
+            ticker = asyncio.create_task(self._checkpoints(pending, stats))
+
+        try:
+            async for user_id in _iterate(user_ids):
+                if self.gate is not None and not await self.gate():
+                    break
+
+                await window.acquire()
+
+                entry = [user_id, False]
+                pending.append(entry)
+
+                task = asyncio.create_task(self._deliver(entry, stats, window))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            if tasks:
+                await asyncio.gather(*tasks)
+
+        finally:
+            if ticker is not None:
+                ticker.cancel()
+
+        self._advance(pending, stats)
+        stats.finished = time.monotonic()
+        logger.info(f'Рассылка завершена: {stats.sent} доставлено, {stats.failed} ошибок, {stats.rate:.1f} сообщ./сек')
+        return stats
+
+    async def _checkpoints(self, pending, stats):
+
+        #сохраняем прогресс по таймеру, в том числе пока рассылка стоит на паузе
+        while True:
+            await asyncio.sleep(self.checkpoint_every)
+            self._advance(pending, stats)
+            await self.on_checkpoint(stats)
+
+    def advance(self, stats):
+
+        #для сохранения прогресса снаружи, например при остановке бота посреди рассылки
+        self._advance(self.pending, stats)
+
+    def _advance(self, pending, stats):
+
+        #курсор двигаем только по непрерывному префиксу завершенных отправок
+        while pending and pending[0][1]:
+            stats.cursor = pending.popleft()[0]
+
+    async def _deliver(self, entry, stats, window):
+
+        try:
+            await self._send(entry[0], stats)
+            stats.sent += 1
+
+        except Exception as e:
+            stats.failed += 1
+
+            if is_permanent(e):
+                stats.deactivated += 1
+
+            if self.on_error is not None:
+                await self.on_error(entry[0], e)
+
+        finally:
+            entry[1] = True
+            window.release()
+
+    async def _send(self, user_id, stats):
+
+        for attempt in range(self.retries + 1):
+            #токен на каждую попытку, повторы тоже идут в общий лимит телеграма
+            await self.bucket.acquire()
+
+            try:
+                return await self.send(user_id)
+
+            except exceptions.RetryAfter as e:
+                if attempt == self.retries:
+                    raise
+
+                stats.retries += 1
+                self.bucket.hold(e.timeout)
+                await asyncio.sleep(e.timeout)
+
+            except TRANSIENT_ERRORS:
+                if attempt == self.retries:
+                    raise
+
+                stats.retries += 1
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+
+
+async def _iterate(user_ids):
+
+    if hasattr(user_ids, '__aiter__'):
+        async for user_id in user_ids:
+            yield user_id
+
+    else:
+        for user_id in user_ids:
+            yield user_id
+
+
+def report_text(stats):
+
+    return f'''
+📊 Отчет о рассылке:
+
+👥 Получателей: {stats.total}
+👤 Активных: {stats.sent}
+👤 Неактивных: {stats.deactivated}
+⚠️ Ошибок отправки: {stats.failed - stats.deactivated}
+⚡️ Скорость: {stats.rate:.1f} сообщ./сек'''
+
+
+class DeactivationBuffer(object):
+    """
+    Копит id заблокировавших бота и пишет их в базу пачками.
+    """
+
+    def __init__(self, size=BROADCAST_FLUSH_SIZE):
+        self.size = size
+        self._ids = []
+
+    async def add(self, user_id, error):
+
+        if not is_permanent(error):
+            return
+
+        self._ids.append(user_id)
+
+        if len(self._ids) >= self.size:
+            await self.flush()
+
+    async def flush(self):
+
+        ids, self._ids = self._ids, []
+
+        if ids:
+            async with AsyncDB() as db:
+                await db.unable_users(ids)
+
+
+STATUS_TEXT = {
+    'running': '▶️ идет',
+    'paused': '⏸ на паузе',
+    'done': '✅ завершена',
+    'cancelled': '⏹ отменена',
+}
+
+
+def format_eta(seconds):
+
+    if seconds is None:
+        return '—'
+
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02}:{seconds:02}' if hours else f'{minutes}:{seconds:02}'
+
+
+def progress_text(job):
+
+    stats = job.stats
+
+    return f'''📣 Рассылка #{job.id}: {STATUS_TEXT.get(job.status, job.status)}
+
+✅ Отправлено: {stats.sent}
+❌ Ошибок: {stats.failed}
+⏳ Осталось: {stats.remaining} из {stats.total}
+⚡️ Скорость: {stats.rate:.1f} сообщ./сек
+🕐 До конца: {format_eta(stats.eta)}'''
+
+
+class BroadcastJob(object):
+    """
+    Рассылка, сохраненная в broadcast_jobs. После перезапуска продолжается с cursor,
+    уже обработанным пользователям повторно не отправляется.
+    """
+
+    def __init__(self, id, kind, text, file_id, admin_id, status='running', cursor=0, total=0, sent=0, failed=0, segment='all', deactivated=0):
+        self.id = id
+        self.segment = segment
+        self.kind = kind
+        self.text = text
+        self.file_id = file_id
+        self.admin_id = admin_id
+        self.status = status
+        self.stats = BroadcastStats(total=total, sent=sent, failed=failed, cursor=cursor, deactivated=deactivated)
+        self.inactive = DeactivationBuffer()
+        #сообщение админу с прогрессом, создается при запуске
+        self.message_id = None
+        #Broadcaster текущего запуска, через него курсор двигается при остановке бота
+        self.broadcaster = None
+        self._running = asyncio.Event()
+
+        if status == 'running':
+            self._running.set()
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    @classmethod
+    async def create(cls, kind, text, file_id, admin_id, segment='all'):
+
+        async with AsyncDB() as db:
+            total = await db.count_recipients(segment)
+            id = await db.create_broadcast_job(kind=kind, text=text, file_id=file_id, admin_id=admin_id, total=total, segment=segment)
+
+        return cls(id, kind, text, file_id, admin_id, total=total, segment=segment)
+
+    async def send(self, user_id):
+
+        if self.kind == 'photo':
+            await bot.send_photo(user_id, photo=self.file_id, caption=self.text)
+
+        else:
+            await bot.send_message(user_id, self.text)
+
+    async def gate(self):
+
+        await self._running.wait()
+        return self.status != 'cancelled'
+
+    async def checkpoint(self, stats):
+
+        #сначала неактивные, иначе после перезапуска курсор уже будет за ними
+        await self.inactive.flush()
+
+        async with AsyncDB() as db:
+            await db.checkpoint_broadcast_job(self.id, status=self.status, cursor=stats.cursor, sent=stats.sent, failed=stats.failed,
+                                            deactivated=stats.deactivated)
+
+    def pause(self):
+        self.status = 'paused'
+        self._running.clear()
+
+    def resume(self):
+        self.status = 'running'
+        self._running.set()
+
+    def cancel(self):
+        self.status = 'cancelled'
+        self._running.set()
+
+    async def show_progress(self):
+
+        text = progress_text(self)
+        markup = ikb.broadcast_job_key(self.id, self.status) if self.status in ('running', 'paused') else None
+
+        try:
+            if self.message_id is None:
+                msg = await bot.send_message(self.admin_id, text, reply_markup=markup)
+                self.message_id = msg.message_id
+
+            else:
+                await bot.edit_message_text(text, self.admin_id, self.message_id, reply_markup=markup)
+
+        except Exception as e:
+            print(f'Ошибка при обновлении прогресса рассылки: {e}')
+
+    async def _report_progress(self):
+
+        #правки сообщения тоже упираются в лимиты телеграма, поэтому не чаще BROADCAST_PROGRESS_SECONDS
+        while True:
+            await asyncio.sleep(BROADCAST_PROGRESS_SECONDS)
+
+            if self.status == 'running':
+                await self.show_progress()
+
+    async def run(self):
+
+        await self.show_progress()
+        reporter = asyncio.create_task(self._report_progress())
+
+        try:
+            async with AsyncDB() as db:
+                self.broadcaster = Broadcaster(self.send, on_error=self.inactive.add, gate=self.gate, on_checkpoint=self.checkpoint)
+                await self.broadcaster.run(db.recipients(self.segment, after=self.stats.cursor), stats=self.stats)
+
+            if self.status != 'cancelled':
+                self.status = 'done'
+
+            await self.checkpoint(self.stats)
+
+        finally:
+            reporter.cancel()
+
+        await self.show_progress()
+
+        markup = ikb.admin_panel_key if self.kind == 'photo' else ikb.close_key
+        await bot.send_message(self.admin_id, report_text(self.stats), reply_markup=markup)
+        return self.stats
+
+
+class JobRegistry(object):
+    """
+    Рассылки, идущие в фоне в этом процессе: у каждой своя задача asyncio,
+    хендлер только запускает ее и сразу отвечает админу.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._tasks = {}
+
+    def spawn(self, job):
+
+        self._jobs[job.id] = job
+        task = asyncio.create_task(job.run())
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda t, id=job.id: self._finished(id, t))
+        return task
+
+    def _finished(self, id, task):
+
+        self._jobs.pop(id, None)
+        self._tasks.pop(id, None)
+
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f'Рассылка #{id} завершилась с ошибкой', exc_info=task.exception())
+
+    def get(self, id):
+        return self._jobs.get(int(id))
+
+    def running(self):
+        return sorted(self._jobs.values(), key=lambda job: job.id)
+
+    async def shutdown(self):
+
+        #сохраняем прогресс, чтобы после перезапуска продолжить с того же места
+        for job in self.running():
+            #курсор за уже завершенные отправки, иначе после перезапуска они уйдут повторно
+            if job.broadcaster is not None:
+                job.broadcaster.advance(job.stats)
+
+            await job.checkpoint(job.stats)
+            self._tasks[job.id].cancel()
+
+
+registry = JobRegistry()
+
+
+async def resume_jobs():
+
+    #незавершенные рассылки после перезапуска бота
+    async with AsyncDB() as db:
+        rows = await db.give_unfinished_broadcast_jobs()
+
+    for row in rows:
+        job = BroadcastJob.from_row(row)
+        logger.info(f'Продолжаю рассылку #{job.id} ({job.status}) с id {job.stats.cursor}')
+        registry.spawn(job)
+
+    return len(rows)
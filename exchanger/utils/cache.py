@@ -0,0 +1,311 @@
+import time
+import threading
+from collections import OrderedDict, namedtuple
+from data.config import USER_CACHE_SIZE, SUBSCRIBE_CACHE_TTL, SUBSCRIBE_NEGATIVE_TTL, REPORT_CACHE_SIZE
+
+
+#кэши в памяти процесса, чтобы частые проверки не ходили в базу
+
+UserFlags = namedtuple('UserFlags', ['banned', 'active', 'last_seen'])
+
+#отличает "нет в кэше" от закэшированного "нет в базе" (None)
+NOT_CACHED = object()
+
+
+class UserStatusCache(object):
+    """
+    LRU кэш флагов пользователя, заполняется лениво при первой проверке.
+    Каждая запись (бан, деактивация, add_user) получает номер поколения: загрузчик
+    запоминает поколение до чтения из базы и не кладет результат, если за это время
+    пользователя успели поменять - иначе только что забаненный закэшировался бы как не забаненный.
+    """
+
+    def __init__(self, maxsize=USER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._floor = 0
+        self._changed = {}
+
+    def get(self, user_id):
+
+        with self._lock:
+            try:
+                flags = self._data[user_id]
+
+            except KeyError:
+                self.misses += 1
+                return NOT_CACHED
+
+            self._data.move_to_end(user_id)
+            self.hits += 1
+            return flags
+
+    def generation(self):
+
+        #берется до чтения из базы и передается в put(since=...)
+        with self._lock:
+            return self._generation
+
+    def _mark(self, user_id):
+
+        self._generation += 1
+        self._changed[user_id] = self._generation
+
+        if len(self._changed) > self.maxsize:
+            #про старые записи больше не помним - загрузки, начатые до этого момента, не кэшируются
+            self._changed.clear()
+            self._floor = self._generation
+
+    def put(self, user_id, flags, since=None):
+
+        #since - поколение на момент начала загрузки, без него значение считается свежей записью
+        with self._lock:
+            if since is None:
+                self._mark(user_id)
+
+            elif since < self._floor or self._changed.get(user_id, 0) > since:
+                return False
+
+            self._data[user_id] = flags
+            self._data.move_to_end(user_id)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+            return True
+
+    def update(self, user_id, **changes):
+
+        with self._lock:
+            self._mark(user_id)
+            flags = self._data.get(user_id)
+
+            if flags is None:
+                #нечего обновлять - пусть следующая проверка сходит в базу
+                self._data.pop(user_id, None)
+
+            else:
+                self._data[user_id] = flags._replace(**changes)
+
+    def invalidate(self, user_id=None):
+
+        with self._lock:
+            if user_id is None:
+                self._data.clear()
+                self._changed.clear()
+                self._generation += 1
+                self._floor = self._generation
+
+            else:
+                self._mark(user_id)
+                self._data.pop(user_id, None)
+
+    def stats(self):
+
+        with self._lock:
+            total = self.hits + self.misses
+
+            return {
+                'size': len(self._data),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+user_status = UserStatusCache()
+
+
+BotSettings = namedtuple('BotSettings', ['status', 'banner'])
+
+
+class SettingsSnapshot(object):
+    """
+    Статус бота и рекламный баннер. Снимок неизменяемый и подменяется целиком,
+    так что читатели всегда видят согласованную пару значений.
+    invalidate() увеличивает version: загрузчик запоминает ее до чтения из базы и передает
+    в replace(version=...), чтобы не положить обратно то, что прочитал до правки.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        return self._snapshot
+
+    def replace(self, snapshot, version=None):
+
+        with self._lock:
+            if version is None or version == self.version:
+                self._snapshot = snapshot
+
+    def update(self, **changes):
+
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot = self._snapshot._replace(**changes)
+
+    def invalidate(self):
+
+        with self._lock:
+            self.version += 1
+            self._snapshot = None
+
+
+bot_settings = SettingsSnapshot()
+
+#список каналов для обязательной подписки: [(id_channel, url), ...]
+channel_list = SettingsSnapshot()
+
+
+#valute: (name, type, minimal, maximal, requisite), methods: (name, type)
+CatalogData = namedtuple('CatalogData', ['version', 'valute', 'methods', 'valute_by_id', 'methods_by_id'])
+
+
+class CatalogCache(object):
+    """
+    Валюты и методы выплат. Любое изменение через админку увеличивает version,
+    после чего каталог перечитывается из базы при следующем обращении.
+    id идет последней колонкой строки, по нему кнопки ссылаются на валюту или метод.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._data = None
+        self._lock = threading.Lock()
+
+    def get(self):
+
+        data = self._data
+
+        if data is None or data.version != self.version:
+            return None
+
+        return data
+
+    def fill(self, version, valute, methods):
+
+        data = CatalogData(version=version, valute=tuple(valute), methods=tuple(methods),
+                           valute_by_id={log[-1]: log for log in valute}, methods_by_id={log[-1]: log for log in methods})
+
+        with self._lock:
+            if version == self.version:
+                self._data = data
+
+        return data
+
+    def bump(self):
+
+        with self._lock:
+            self.version += 1
+
+
+catalog_cache = CatalogCache()
+
+
+class MembershipCache(object):
+    """
+    Подписан ли пользователь на канал. Отрицательный ответ живет меньше,
+    чтобы только что подписавшийся пользователь не ждал долго.
+    """
+
+    def __init__(self, ttl=SUBSCRIBE_CACHE_TTL, negative_ttl=SUBSCRIBE_NEGATIVE_TTL, maxsize=USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = {}
+
+    def get(self, user_id, channel_id):
+
+        entry = self._data.get((user_id, channel_id))
+
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user_id, channel_id, subscribed):
+
+        now = time.monotonic()
+
+        if len(self._data) >= self.maxsize:
+            self._purge(now)
+
+        ttl = self.ttl if subscribed else self.negative_ttl
+        self._data[(user_id, channel_id)] = (now + ttl, subscribed)
+
+    def _purge(self, now):
+
+        for key in [k for k, v in self._data.items() if v[0] < now]:
+            del self._data[key]
+
+        #если все записи еще живые - освобождаем место с самых старых
+        while len(self._data) >= self.maxsize:
+            del self._data[next(iter(self._data))]
+
+    def invalidate(self, channel_id=None):
+
+        if channel_id is None:
+            self._data.clear()
+
+        else:
+            for key in [k for k in self._data if k[1] == channel_id]:
+                del self._data[key]
+
+
+membership = MembershipCache()
+
+
+class ReportCache(object):
+    """
+    Отчеты /report по ключу (начало, конец, пара, пользователь). Любая новая сделка
+    увеличивает generation, и все посчитанные раньше отчеты перестают отдаваться.
+    """
+
+    def __init__(self, maxsize=REPORT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.generation = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None or entry[0] != self.generation:
+                return None
+
+            return entry[1]
+
+    def put(self, generation, key, report):
+
+        with self._lock:
+            #пока считали, могла прийти сделка - такой отчет уже устарел
+            if generation != self.generation:
+                return
+
+            self._data[key] = (generation, report)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def bump(self):
+
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+
+report_cache = ReportCache()
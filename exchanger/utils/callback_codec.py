@@ -0,0 +1,134 @@
+from utils.async_database import AsyncDB
+
+
+#компактная callback_data: 'код:поле.поле' с числами в base36 вместо названий валют, методов и сумм
+#валюты и методы выплат передаются своим id из каталога, так что кнопка всегда влезает в 64 байта
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+#действие -> (код, поля); поле 'valute' и 'method' - id из каталога, 'id' - просто число
+ACTIONS = {
+    'exchange': ('e', ('valute',)),
+    'pmethod': ('p', ('method',)),
+    'vdelet': ('vd', ('valute',)),
+    'methoddel': ('md', ('method',)),
+    'anket': ('aa', ('id',)),
+    'anket_false': ('ar', ('id',)),
+    'usanket_true': ('ut', ('id',)),
+    'usanket_false': ('uf', ('id',)),
+    'confirm_good': ('cg', ('id',)),
+    'confirm_false': ('cf', ('id',)),
+}
+
+_CODES = {code: (action, fields) for action, (code, fields) in ACTIONS.items()}
+
+if len(_CODES) != len(ACTIONS):
+    raise ValueError('Коды действий callback_data повторяются')
+
+
+def to36(number):
+
+    number = int(number)
+
+    if number < 0:
+        raise ValueError(f'Отрицательное число в callback_data: {number}')
+
+    digits = ''
+
+    while True:
+        number, rest = divmod(number, 36)
+        digits = DIGITS[rest] + digits
+
+        if not number:
+            return digits
+
+
+def prefix(action):
+
+    #для фильтров Text(startswith=...)
+    return ACTIONS[action][0] + ':'
+
+
+def encode(action, *values):
+
+    code, fields = ACTIONS[action]
+
+    if len(values) != len(fields):
+        raise ValueError(f'{action} ждет поля {fields}, передано {values}')
+
+    return f'{code}:' + '.'.join(to36(value) for value in values)
+
+
+def unpack(data):
+
+    #'aa:rs' -> ('anket', (1000,)), чужой или битый формат -> None
+    code, sep, payload = data.partition(':')
+    known = _CODES.get(code)
+
+    if not sep or known is None:
+        return None
+
+    action, fields = known
+    parts = payload.split('.')
+
+    if len(parts) != len(fields):
+        return None
+
+    try:
+        return action, tuple(int(part, 36) for part in parts)
+
+    except ValueError:
+        return None
+
+
+async def decode(data):
+
+    #поля с id заменяются строками каталога, None - кнопка устарела (валюту или метод уже удалили)
+    unpacked = unpack(data)
+
+    if unpacked is None:
+        return None
+
+    action, ids = unpacked
+    fields = ACTIONS[action][1]
+
+    if 'valute' not in fields and 'method' not in fields:
+        return ids
+
+    async with AsyncDB() as db:
+        catalog = await db.catalog()
+
+    values = []
+
+    for field, id in zip(fields, ids):
+        if field == 'valute':
+            id = catalog.valute_by_id.get(id)
+
+        elif field == 'method':
+            id = catalog.methods_by_id.get(id)
+
+        if id is None:
+            return None
+
+        values.append(id)
+
+    return tuple(values)
+
+
+async def catalog_row(call):
+
+    #строка каталога из кнопки, на устаревшую кнопку отвечает алертом и возвращает None
+    values = await decode(call.data)
+
+    if values is None:
+        await call.answer('Эта кнопка устарела, откройте список заново', show_alert=True)
+        return None
+
+    return values[0]
+
+
+async def catalog_name(call):
+
+    #только название валюты или метода
+    row = await catalog_row(call)
+    return None if row is None else row[0]
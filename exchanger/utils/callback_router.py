@@ -0,0 +1,205 @@
+import inspect
+import logging
+from aiogram import types
+from aiogram.dispatcher.filters.builtin import StateFilter
+from aiogram.dispatcher.handler import _get_spec, _check_spec
+from aiogram.dispatcher.filters.state import State, StatesGroup
+
+
+#все коллбеки идут через один обработчик: callback_data разбирается по словарю точных значений
+#и префиксному дереву за один проход, а не перебором фильтров всех хендлеров по очереди
+
+logger = logging.getLogger(__name__)
+
+
+def state_names(state):
+
+    #как StateFilter: None - без состояния, '*' - любое, State, StatesGroup или их список
+    if state == '*':
+        return '*'
+
+    if not isinstance(state, (list, set, tuple, frozenset)):
+        state = [state]
+
+    names = set()
+
+    for item in state:
+        if isinstance(item, State):
+            names.add(item.state)
+
+        elif inspect.isclass(item) and issubclass(item, StatesGroup):
+            names.update(item.all_states_names)
+
+        else:
+            names.add(item)
+
+    return frozenset(names)
+
+
+class Route(object):
+
+    def __init__(self, key, exact, handler, state=None, user_id=None):
+        self.key = key
+        self.exact = exact
+        self.handler = handler
+        self.states = state_names(state)
+        self.user_ids = None if user_id is None else frozenset(user_id if isinstance(user_id, (list, set, tuple, frozenset)) else [user_id])
+        #аргументы обработчика, как их разбирает aiogram: из data передаются только объявленные
+        self.spec = _get_spec(handler)
+
+    def __repr__(self):
+        kind = 'text' if self.exact else 'startswith'
+        return f'<Route {kind}={self.key!r} state={self.states} {self.handler.__module__}.{self.handler.__name__}>'
+
+    def matches_state(self, state):
+        return self.states == '*' or state in self.states
+
+    def overlaps(self, other):
+        return self.states == '*' or other.states == '*' or bool(self.states & other.states)
+
+
+class CallbackRouter(object):
+    """
+    Точные значения (text=) ищутся в словаре, префиксы (startswith=) - в дереве по символам,
+    из подходящих префиксов выигрывает самый длинный. Два маршрута с одним ключом
+    и пересекающимися состояниями - ошибка, она всплывает при setup(), а не на клике.
+    """
+
+    def __init__(self):
+        self.routes = []
+        self._exact = {}
+        self._trie = {}
+        self.dispatcher = None
+
+    def route(self, text=None, startswith=None, state=None, user_id=None):
+
+        #замена @dp.callback_query_handler(text=..., text_startswith=..., state=..., user_id=...)
+        if (text is None) == (startswith is None):
+            raise ValueError('Нужен ровно один из параметров text или startswith')
+
+        exact = text is not None
+        keys = text if exact else startswith
+
+        def decorator(handler):
+            for key in [keys] if isinstance(keys, str) else keys:
+                self.add(Route(key, exact, handler, state=state, user_id=user_id))
+
+            return handler
+
+        return decorator
+
+    def add(self, route):
+
+        if route.exact:
+            self._exact.setdefault(route.key, []).append(route)
+
+        else:
+            node = self._trie
+
+            for char in route.key:
+                node = node.setdefault(char, {})
+
+            node.setdefault(None, []).append(route)
+
+        self.routes.append(route)
+
+    def conflicts(self):
+
+        #[(маршрут, маршрут), ...] с одним ключом и общим состоянием - какой из них сработает, зависело бы от порядка импорта
+        found = []
+        same_key = {}
+
+        for route in self.routes:
+            same_key.setdefault((route.key, route.exact), []).append(route)
+
+        for routes in same_key.values():
+            for i, first in enumerate(routes):
+                found.extend((first, second) for second in routes[i + 1:] if first.overlaps(second))
+
+        return found
+
+    def shadowed(self):
+
+        #префикс, который перекрывает другой маршрут: раньше срабатывал тот, что зарегистрирован первым, теперь - более длинный
+        return [(short, long) for short in self.routes if not short.exact
+                for long in self.routes if long is not short and long.key != short.key
+                and long.key.startswith(short.key) and short.overlaps(long)]
+
+    def setup(self, dispatcher):
+
+        conflicts = self.conflicts()
+
+        if conflicts:
+            raise ValueError('Конфликтующие маршруты коллбеков:\n' + '\n'.join(f'{a} и {b}' for a, b in conflicts))
+
+        for short, long in self.shadowed():
+            logger.warning(f'Префикс {short} перекрывает {long}, для него сработает более длинный')
+
+        self.dispatcher = dispatcher
+        dispatcher.register_callback_query_handler(self.dispatch, self.resolve, state='*')
+        logger.info(f'Маршрутов коллбеков: {len(self.routes)}')
+
+    def candidates(self, data):
+
+        #точное совпадение, затем префиксы от длинного к короткому
+        found = list(self._exact.get(data, ()))
+        node = self._trie
+        prefixes = []
+
+        for char in data:
+            node = node.get(char)
+
+            if node is None:
+                break
+
+            if None in node:
+                prefixes.append(node[None])
+
+        for routes in reversed(prefixes):
+            found.extend(routes)
+
+        return found
+
+    async def current_state(self, call):
+
+        #состояние читается один раз на апдейт, как это делает StateFilter
+        try:
+            return StateFilter.ctx_state.get()
+
+        except LookupError:
+            chat, user = call.message.chat.id if call.message else None, call.from_user.id
+            state = await self.dispatcher.storage.get_state(chat=chat, user=user)
+            StateFilter.ctx_state.set(state)
+            return state
+
+    def pick(self, routes, user_id, state):
+
+        for route in routes:
+            if route.user_ids is not None and user_id not in route.user_ids:
+                continue
+
+            if route.matches_state(state):
+                return route
+
+        return None
+
+    async def resolve(self, call: types.CallbackQuery):
+
+        routes = self.candidates(call.data or '')
+
+        if not routes:
+            return False
+
+        #состояние нужно только если хоть один кандидат не на любое состояние
+        state = await self.current_state(call) if any(route.states != '*' for route in routes) else None
+        route = self.pick(routes, call.from_user.id, state)
+
+        return False if route is None else {'route': route}
+
+    async def dispatch(self, call: types.CallbackQuery, route, **data):
+
+        #state, user_ctx и остальное из мидлварей - так же, как aiogram передал бы их зарегистрированному обработчику
+        return await route.handler(call, **_check_spec(route.spec, data))
+
+
+router = CallbackRouter()
@@ -0,0 +1,55 @@
+from keyboards import inline_keyboards as ikb
+from utils.async_database import AsyncDB
+
+
+#клавиатуры валют и методов выплат строятся один раз на версию каталога
+
+_keyboards = {}
+
+
+def _build(data, kind, type_):
+
+    valute = [log for log in data.valute if log[1] == type_]
+    methods = [log for log in data.methods if log[1] == type_]
+
+    if kind == 'exchange':
+        return ikb.exchange_user(valute_list=valute, type_=type_)
+
+    elif kind == 'payment':
+        return ikb.give_payment_method_key(type_=methods)
+
+    elif kind == 'delete_valute':
+        return ikb.delet_valute_key(valute_list=valute)
+
+    elif kind == 'delete_payment':
+        return ikb.delet_payment_key(methods)
+
+    raise ValueError(f'Неизвестный тип клавиатуры: {kind}')
+
+
+async def keyboard(kind, type_):
+
+    async with AsyncDB() as db:
+        data = await db.catalog()
+
+    key = (kind, type_, data.version)
+    markup = _keyboards.get(key)
+
+    if markup is None:
+        markup = _build(data, kind, type_)
+
+        #клавиатуры прошлых версий больше не понадобятся
+        for old in [k for k in _keyboards if k[2] != data.version]:
+            _keyboards.pop(old, None)
+
+        _keyboards[key] = markup
+
+    return markup
+
+
+async def min_and_max(name):
+
+    async with AsyncDB() as db:
+        data = await db.catalog()
+
+    return [(log[2], log[3]) for log in data.valute if log[0] == name]
@@ -0,0 +1,134 @@
+import sqlite3
+import threading
+import queue
+from contextlib import contextmanager
+from data.config import DB_PATH, DB_READ_POOL, DB_CACHE_KB
+from utils.group_commit import GroupCommitWriter
+
+
+#общие соединения с базой на весь процесс: одно на запись и небольшой пул на чтение
+
+#WAL позволяет читать параллельно с записью, а synchronous=NORMAL в WAL не делает fsync на каждый коммит
+PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    f'PRAGMA cache_size=-{DB_CACHE_KB}',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA busy_timeout=5000',
+]
+
+
+class ConnectionManager(object):
+    def __init__(self, db_fp=DB_PATH, pool_size=DB_READ_POOL):
+        self.db_fp = db_fp
+        self.pool_size = max(1, pool_size)
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._readers = queue.LifoQueue()
+        self._opened = 0
+        self._pool_lock = threading.Lock()
+        self.group_writer = GroupCommitWriter(self)
+
+    def connect(self):
+
+        conn = sqlite3.connect(self.db_fp, check_same_thread=False)
+
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+
+        return conn
+
+    def submit(self, func):
+        """
+        Запись через групповой коммит, возвращает concurrent.futures.Future с результатом func(cur).
+        """
+        return self.group_writer.submit(func)
+
+    @contextmanager
+    def writer(self):
+        """
+        Единственное соединение на запись, коммит по выходу из блока.
+        """
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self.connect()
+
+            cur = self._writer.cursor()
+            try:
+                yield cur
+                self._writer.commit()
+
+            except Exception:
+                self._writer.rollback()
+                raise
+
+            finally:
+                cur.close()
+
+    @contextmanager
+    def reader(self):
+        """
+        Соединение из пула на чтение, возвращается в пул по выходу из блока.
+        """
+        conn = self._borrow()
+        cur = conn.cursor()
+        try:
+            yield cur
+
+        finally:
+            cur.close()
+            self._readers.put(conn)
+
+    def _borrow(self):
+        try:
+            return self._readers.get_nowait()
+
+        except queue.Empty:
+            pass
+
+        with self._pool_lock:
+            if self._opened < self.pool_size:
+                self._opened += 1
+                return self.connect()
+
+        return self._readers.get()
+
+    def close(self):
+        self.group_writer.stop()
+
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+        with self._pool_lock:
+            while True:
+                try:
+                    self._readers.get_nowait().close()
+                    self._opened -= 1
+
+                except queue.Empty:
+                    break
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(db_fp=DB_PATH):
+
+    with _managers_lock:
+        manager = _managers.get(db_fp)
+
+        if manager is None:
+            manager = _managers[db_fp] = ConnectionManager(db_fp)
+
+        return manager
+
+
+def close_all():
+
+    with _managers_lock:
+        for manager in _managers.values():
+            manager.close()
+        _managers.clear()
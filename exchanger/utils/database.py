@@ -1,70 +1,109 @@
-import sqlite3, requests, bs4
+import requests, bs4
 from data.config import *
-from datetime import date
-import datetime
+import time
+from utils.connection import get_manager
+from utils.statistic_func import GRANULARITIES, period_start
+from utils.cache import user_status, UserFlags, NOT_CACHED, bot_settings, BotSettings, catalog_cache, channel_list, membership, report_cache
 
 
 class DB(object):
-    def __init__(self, db_fp=f'data/data.db'):
+    def __init__(self, db_fp=DB_PATH):
         self.db_fp = db_fp
         self.headers = {"User-Agent":"Mozilla/5.0 (X11; Linux x86_64; rv:91.0) Gecko/20100101 Firefox/91.0"}
-        self.base = sqlite3.connect(self.db_fp, check_same_thread=False)
-        self.cur = self.base.cursor()
-        self.create_tables()
+        #соединение не открывается на каждый DB(), запросы берут его из общего менеджера
+        #схема создается миграциями при старте бота (utils/migrations.py)
+        self.pool = get_manager(self.db_fp)
 
     def __enter__(self):
         return self
 
     def __exit__(self, type, value, traceback):
-        self.base.commit()
-        self.cur.close()
-        self.base.close()
-
-
-    def create_tables(self):
-        self.base.execute("""CREATE TABLE IF NOT EXISTS users(
-                    id PRIMARY KEY, 
-                    name_user TEXT,
-                    username TEXT,
-                    ban TEXT,
-                    active TEXT)""")
-        self.base.execute('CREATE TABLE IF NOT EXISTS payment_method(name TEXT PRIMARY KEY, type TEXT)')
-        self.base.execute('CREATE TABLE IF NOT EXISTS valute(name TEXT PRIMARY KEY, type TEXT, minimal TEXT, maximal TEXT, requisite TEXT)')
-        self.base.execute('CREATE TABLE IF NOT EXISTS chanel(id_channel TEXT PRIMARY KEY, url TEXT)')
-        self.base.execute('CREATE TABLE IF NOT EXISTS banner(id TEXT PRIMARY KEY, text TEXT)')        
-        self.base.execute('CREATE TABLE IF NOT EXISTS status_active(id TEXT PRIMARY KEY, status TEXT)')
-        try:
-            self.cur.execute('INSERT INTO status_active VALUES(?, ?)', ['1', 'on'])
-        except:
-            pass
-        self.base.execute('CREATE TABLE IF NOT EXISTS {}(amount TEXT, id TEXT, exchange TEXT, data TEXT)'.format('history'))
-        self.base.commit()
+        pass
 
-    def add_history(self, amount, id, name_exchange):
 
-        week_number = datetime.datetime.today().isocalendar()[1]
+    def fetchall(self, sql, params=()):
+
+        with self.pool.reader() as cur:
+            return cur.execute(sql, params).fetchall()
+
+    def fetchone(self, sql, params=()):
+
+        with self.pool.reader() as cur:
+            return cur.execute(sql, params).fetchone()
+
+    def iterate(self, sql, params=(), size=EXPORT_CHUNK_ROWS):
+
+        #построчно, но из базы читаем кусками по size - в памяти не больше одного куска
+        with self.pool.reader() as cur:
+            cur.execute(sql, params)
+
+            while True:
+                rows = cur.fetchmany(size)
+
+                if not rows:
+                    return
 
-        dt_now = date.today()
+                yield from rows
 
-        dt_now = f'{dt_now}-{str(week_number)}'
+    def submit(self, sql, params=()):
+
+        return self.pool.submit(lambda cur: cur.execute(sql, params).rowcount)
+
+    def execute(self, sql, params=()):
+
+        #ждем коммита групповой транзакции, в которую попал запрос
+        return self.submit(sql, params).result()
+
+
+    def add_history(self, amount, id, name_exchange):
+
+        now = int(time.time())
+        amount, id, name_exchange = float(amount), int(id), str(name_exchange)
+
+        def insert(cur):
+            cur.execute('INSERT INTO history VALUES(?, ?, ?, ?)', [amount, id, name_exchange, now])
+            cur.executemany("""INSERT INTO history_rollup VALUES(?, ?, ?, ?, 1)
+                            ON CONFLICT(granularity, period_start, exchange)
+                            DO UPDATE SET amount = amount + excluded.amount, deals = deals + 1""",
+                            [(granularity, period_start(now, granularity), name_exchange, amount) for granularity in GRANULARITIES])
 
         try:
-            self.cur.execute('INSERT INTO history VALUES(?, ?, ?, ?)',
-                    [str(amount), str(id), str(name_exchange), str(dt_now)])
-            self.base.commit()
+            #сделка и сводки пишутся одной транзакцией, так что статистика не расходится с историей
+            self.pool.submit(insert).result()
+            report_cache.bump()
+            return True
+
         except Exception as e:
             print(f'ОШибка в добавлении в историю :{e}')
 
     def give_custom_history_db(self):
-        
+
         try:
-            r = self.cur.execute('SELECT * FROM history').fetchall()
+            r = self.fetchall('SELECT * FROM history')
             return r
 
         except Exception as e:
             print(f'ОШибка при выдаче кастомной итории: {e}')
             return False
 
+    def give_profit_by_exchange(self, granularity=None, start=None):
+
+        #[(exchange, сумма), ...] из сводок: за все время или за один день/неделю/месяц,
+        #обмены без сделок за период тоже попадают в список с нулем
+        try:
+            totals = self.fetchall("SELECT exchange, TOTAL(amount) FROM history_rollup WHERE granularity = 'month' GROUP BY exchange ORDER BY exchange")
+
+            if granularity is None:
+                return totals
+
+            profit = dict(self.fetchall('SELECT exchange, amount FROM history_rollup WHERE granularity = ? AND period_start = ?',
+                                    [granularity, int(start)]))
+            return [(name, profit.get(name, 0.0)) for name, total in totals]
+
+        except Exception as e:
+            print(f'Ошибка при подсчете профита: {e}')
+            return []
+
 
 
 
@@ -72,20 +111,40 @@ class DB(object):
 
 
 
+    def reload_settings(self):
+
+        #перечитывает статус и баннер из базы, например после ручной правки data.db
+        status = self.fetchone('SELECT status FROM status_active WHERE id = ?', ['1'])
+        banner = self.fetchone('SELECT text FROM banner WHERE id = ?', ['1'])
+
+        snapshot = BotSettings(status=status[0] if status else 'on', banner=banner[0] if banner else None)
+        bot_settings.replace(snapshot)
+        return snapshot
+
+    def settings(self):
+
+        snapshot = bot_settings.get()
+
+        if snapshot is None:
+            snapshot = self.reload_settings()
+
+        return snapshot
+
     def give_status_bot(self):
 
-        r = self.cur.execute('SELECT * FROM status_active').fetchall()
+        r = [('1', self.settings().status)]
         return r
 
     def on_off_bot(self, status):
 
-        self.cur.execute(f'UPDATE status_active SET status = ? WHERE id = ?', [status, '1'])
-        self.base.commit()
+        self.execute(f'UPDATE status_active SET status = ? WHERE id = ?', [status, '1'])
+        bot_settings.update(status=status)
         return True
 
     def give_banner(self):
 
-        req = self.cur.execute('SELECT * FROM banner').fetchall()
+        banner = self.settings().banner
+        req = [] if banner is None else [('1', banner)]
         return req
 
 
@@ -95,8 +154,8 @@ class DB(object):
             if move == 'add':
 
                 try:
-                    self.cur.execute('INSERT INTO banner VALUES(?, ?)', ['1', text])
-                    self.base.commit()
+                    self.execute('INSERT INTO banner VALUES(?, ?)', ['1', text])
+                    bot_settings.update(banner=text)
                     return True
 
                 except Exception as e:
@@ -105,8 +164,8 @@ class DB(object):
             else:
 
                 try:
-                    self.cur.execute('DELETE FROM banner WHERE id = ?', ['1'])
-                    self.base.commit()
+                    self.execute('DELETE FROM banner WHERE id = ?', ['1'])
+                    bot_settings.update(banner=None)
                     return True
 
                 except Exception as e:
@@ -121,8 +180,9 @@ class DB(object):
     def delete_channel(self, id):
 
         try:
-            self.cur.execute('DELETE FROM chanel WHERE id = ?', [str(id)])
-            self.base.commit()
+            self.execute('DELETE FROM chanel WHERE id_channel = ?', [str(id)])
+            channel_list.invalidate()
+            membership.invalidate(str(id))
             return True
 
         except Exception as e:
@@ -133,8 +193,8 @@ class DB(object):
     def add_channel(self, id_channel, url):
 
         try:
-            self.cur.execute('INSERT INTO chanel VALUES(?, ?)', [str(id_channel), str(url)])
-            self.base.commit()
+            self.execute('INSERT INTO chanel VALUES(?, ?)', [str(id_channel), str(url)])
+            channel_list.invalidate()
             return True
 
         except Exception as e:
@@ -143,37 +203,56 @@ class DB(object):
 
     def give_list_channel(self):
 
-        req = self.cur.execute('SELECT * FROM chanel').fetchall()
+        req = channel_list.get()
+
+        if req is None:
+            #версию запоминаем до чтения, как в catalog(): если каналы поменяют во время чтения, список не закэшируется
+            version = channel_list.version
+            req = self.fetchall('SELECT * FROM chanel')
+            channel_list.replace(req, version=version)
+
         return req
 
 
     def give_stat_admin(self):
 
         try:
-            req = self.cur.execute('SELECT * FROM stat').fetchall()
+            req = self.fetchall('SELECT * FROM stat')
             return req
-        
+
         except Exception as e:
             print(f'ОШибка при выдаче статистики: {e}')
 
     def add_seccesful_exchange(self, id, exchange, amount, data):
 
         try:
-            self.cur.execute('INSERT INTO stat VALUES(?, ?, ?, ?)', [str(id), str(exchange), str(amount), str(data)])
-            self.base.commit()
+            self.execute('INSERT INTO stat VALUES(?, ?, ?, ?)', [str(id), str(exchange), str(amount), str(data)])
             return True
 
         except Exception as e:
             print(f'ОШибка при занесении сделки в базу: {e}')
             return False
 
+    def catalog(self):
+
+        data = catalog_cache.get()
+
+        if data is None:
+            #версию запоминаем до чтения: если каталог поменяется во время чтения, он перечитается еще раз
+            version = catalog_cache.version
+            valute = self.fetchall('SELECT name, type, minimal, maximal, requisite, id FROM valute ORDER BY id')
+            methods = self.fetchall('SELECT name, type, id FROM payment_method ORDER BY id')
+            data = catalog_cache.fill(version, valute, methods)
+
+        return data
+
     def add_or_delet_payment_method(self, name, type, move):
 
         if move == 'add':
 
             try:
-                self.cur.execute('INSERT INTO payment_method VALUES(?, ?)', [str(name), str(type)])
-                self.base.commit()
+                self.execute('INSERT INTO payment_method(name, type) VALUES(?, ?)', [str(name), str(type)])
+                catalog_cache.bump()
                 return True
 
             except Exception as e:
@@ -183,8 +262,8 @@ class DB(object):
         elif move == 'delete':
 
             try:
-                self.cur.execute('DELETE FROM payment_method WHERE name = ?', [name])
-                self.base.commit()
+                self.execute('DELETE FROM payment_method WHERE name = ?', [name])
+                catalog_cache.bump()
                 return True
 
             except Exception as e:
@@ -198,7 +277,7 @@ class DB(object):
     def give_payment_method(self, type):
 
         try:
-            req = self.cur.execute('SELECT * FROM payment_method WHERE type = ?', [type]).fetchall()
+            req = [log for log in self.catalog().methods if log[1] == type]
             return req
 
         except Exception as e:
@@ -208,34 +287,232 @@ class DB(object):
     def unable_user(self, id):
 
         try:
-            self.cur.execute(f'UPDATE users SET active = ? WHERE id = ?', ['0', str(id)])
-            self.base.commit()
+            self.execute('UPDATE users SET active = 0 WHERE id = ?', [int(id)])
+            user_status.update(int(id), active=False)
             return True
 
         except Exception as e:
             print(f'Ошибка при выдаче неактива пользователю: {e}')
             return False
 
+    def unable_users(self, ids):
+
+        ids = [int(id) for id in ids]
+
+        def update(cur):
+            cur.executemany('UPDATE users SET active = 0 WHERE id = ?', [(id,) for id in ids])
+
+        try:
+            #одна транзакция на всю пачку вместо коммита на каждого пользователя
+            self.pool.submit(update).result()
+
+            for id in ids:
+                user_status.update(id, active=False)
+
+            return True
+
+        except Exception as e:
+            print(f'Ошибка при выдаче неактива пользователям: {e}')
+            return False
+
     def stat_user(self):
         try:
-            req = self.cur.execute('SELECT id, active FROM users').fetchall()
+            req = self.fetchall('SELECT id, active FROM users')
             return req
         except Exception as e:
             print(e)
 
+    def history_report(self, start, end, valute=None, user=None):
+
+        #[(exchange, сумма, сделок, средний чек), ...] - поиск по диапазону индекса history(data, ...)
+        #в history.exchange лежит валюта, которую отдает пользователь (valute_from), а не пара, поэтому и фильтр по валюте
+        key = (int(start), int(end), valute, user)
+        report = report_cache.get(key)
+
+        if report is not None:
+            return report
+
+        generation = report_cache.generation
+        where, params = ['data >= ?', 'data < ?'], [int(start), int(end)]
+
+        if valute is not None:
+            where.append('exchange = ?')
+            params.append(valute)
+
+        if user is not None:
+            where.append('id = ?')
+            params.append(int(user))
+
+        try:
+            report = self.fetchall(f'SELECT exchange, TOTAL(amount), COUNT(*), AVG(amount) FROM history WHERE {" AND ".join(where)} GROUP BY exchange ORDER BY exchange', params)
+
+        except Exception as e:
+            print(f'Ошибка при построении отчета: {e}')
+            return []
+
+        report_cache.put(generation, key, report)
+        return report
+
+    def reserve_deal_id_block(self):
+
+        def reserve(cur):
+            cur.execute("""INSERT INTO meta VALUES('deal_id_hi', 1)
+                        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1""")
+            return int(cur.execute("SELECT value FROM meta WHERE key = 'deal_id_hi'").fetchone()[0])
+
+        return self.pool.submit(reserve).result()
+
+    def add_deal_events(self, events):
+
+        #[(app_id, stage, pair, ts), ...] - повторный клик по той же кнопке не перезаписывает время
+        def insert(cur):
+            cur.executemany('INSERT OR IGNORE INTO deal_events VALUES(?, ?, ?, ?)', events)
+
+        try:
+            self.pool.submit(insert).result()
+            return True
+
+        except Exception as e:
+            print(f'Ошибка при записи этапов сделок: {e}')
+            return False
+
+    def give_deal_durations(self, start, end, since):
+
+        #[(пара, секунды между этапами start и end), ...] по паре и времени, end берется по индексу (stage, ts)
+        return self.fetchall("""SELECT e.pair, e.ts - s.ts FROM deal_events e
+                            JOIN deal_events s ON s.app_id = e.app_id AND s.stage = ?
+                            WHERE e.stage = ? AND e.ts >= ?
+                            ORDER BY e.pair, 2""", [start, end, int(since)])
+
+    def create_application(self, id, user_id, username, full_name, valute_from, valute_to, payment_method, amount, requisites, comment):
+
+        now = int(time.time())
+        return self.execute("""INSERT INTO applications VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'submitted', ?, ?)""",
+                            [int(id), int(user_id), username, full_name, valute_from, valute_to, payment_method,
+                             float(amount), requisites, comment, now, now])
+
+    def transition_application(self, id, status_from, status_to, user_id=None):
+
+        #один UPDATE по первичному ключу с проверкой статуса: из двух одновременных кликов пройдет только первый
+        sql = 'UPDATE applications SET status = ?, updated = ? WHERE id = ? AND status = ?'
+        params = [status_to, int(time.time()), int(id), status_from]
+
+        if user_id is not None:
+            sql += ' AND user_id = ?'
+            params.append(int(user_id))
+
+        def update(cur):
+            if cur.execute(sql, params).rowcount:
+                return cur.execute('SELECT * FROM applications WHERE id = ?', [int(id)]).fetchone()
+
+        try:
+            return self.pool.submit(update).result()
+
+        except Exception as e:
+            print(f'Ошибка при смене статуса заявки: {e}')
+            return None
+
+    def give_application(self, id):
+
+        return self.fetchone('SELECT * FROM applications WHERE id = ?', [int(id)])
+
+    def give_user_counters(self):
+
+        #(всего, активных, забаненных) - одна строка, которую обновляют триггеры на users
+        try:
+            return self.fetchone('SELECT total, active, banned FROM user_counters WHERE id = 1')
+
+        except Exception as e:
+            print(f'Ошибка при выдаче счетчиков пользователей: {e}')
+            return (0, 0, 0)
+
     def give_id_user(self):
         try:
-            req = self.cur.execute('SELECT id FROM users').fetchall()
+            req = self.fetchall('SELECT id FROM users')
             return req
         except Exception as e:
             print(e)
 
+    def recipients_filter(self, segment):
+
+        #segment: 'all', 'deals' (были сделки) или 'recent_N' (заходили за последние N дней)
+        where, params = ['active = 1'], []
+
+        if segment == 'deals':
+            where.append('EXISTS (SELECT 1 FROM history WHERE history.id = users.id)')
+
+        elif segment.startswith('recent_'):
+            where.append('last_seen >= ?')
+            params.append(int(time.time()) - int(segment.replace('recent_', '')) * 86400)
+
+        elif segment != 'all':
+            raise ValueError(f'Неизвестный сегмент рассылки: {segment}')
+
+        return ' AND '.join(where), params
+
+    def give_recipients_page(self, after, limit, segment='all'):
+
+        #keyset-пагинация по первичному ключу: каждая страница - поиск по индексу, а не OFFSET
+        where, params = self.recipients_filter(segment)
+        return self.fetchall(f'SELECT id FROM users WHERE id > ? AND {where} ORDER BY id LIMIT ?', [int(after), *params, int(limit)])
+
+    def count_recipients(self, segment='all'):
+
+        where, params = self.recipients_filter(segment)
+        return self.fetchone(f'SELECT COUNT(*) FROM users WHERE {where}', params)[0]
+
+
+    def create_broadcast_job(self, kind, text, file_id, admin_id, total, segment='all'):
+
+        now = int(time.time())
+
+        def insert(cur):
+            cur.execute('INSERT INTO broadcast_jobs(kind, text, file_id, admin_id, status, total, created, updated, segment) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        [kind, text, file_id, int(admin_id), 'running', int(total), now, now, segment])
+            return cur.lastrowid
+
+        return self.pool.submit(insert).result()
+
+    def give_broadcast_job(self, id):
+
+        return self.fetchone('SELECT * FROM broadcast_jobs WHERE id = ?', [int(id)])
+
+    def give_unfinished_broadcast_jobs(self):
+
+        return self.fetchall("SELECT id, kind, text, file_id, admin_id, status, cursor, total, sent, failed, segment, deactivated FROM broadcast_jobs WHERE status IN ('running', 'paused') ORDER BY id")
+
+    def checkpoint_broadcast_job(self, id, status, cursor, sent, failed, deactivated=0):
+
+        try:
+            self.execute('UPDATE broadcast_jobs SET status = ?, cursor = ?, sent = ?, failed = ?, deactivated = ?, updated = ? WHERE id = ?',
+                        [status, int(cursor), int(sent), int(failed), int(deactivated), int(time.time()), int(id)])
+            return True
+
+        except Exception as e:
+            print(f'Ошибка при сохранении прогресса рассылки: {e}')
+            return False
+
+    def set_broadcast_status(self, id, status):
+
+        try:
+            r = self.execute("UPDATE broadcast_jobs SET status = ?, updated = ? WHERE id = ? AND status IN ('running', 'paused')",
+                            [status, int(time.time()), int(id)])
+            return r > 0
+
+        except Exception as e:
+            print(f'Ошибка при смене статуса рассылки: {e}')
+            return False
+
 
     def add_user(self, id, name_user, username):
-        
+
         try:
-            self.cur.execute('INSERT INTO users VALUES(?, ?, ?, ?, ?)', [str(id), name_user, username, 'None', '1'])
-            self.base.commit()
+            #повторный /start возвращает в рассылку того, кого пометили неактивным после блокировки бота
+            now = int(time.time())
+            self.execute("""INSERT INTO users(id, name_user, username, ban, active, last_seen) VALUES(?, ?, ?, 0, 1, ?)
+                            ON CONFLICT(id) DO UPDATE SET active = 1, last_seen = excluded.last_seen""", [int(id), name_user, username, now])
+            #бан у существующего пользователя сохраняется, поэтому флаги перечитаются из базы
+            user_status.invalidate(int(id))
             return True
 
         except Exception as e:
@@ -246,20 +523,20 @@ class DB(object):
     def ban_user(self, id):
 
         try:
-            self.cur.execute(f'UPDATE users SET ban = ? WHERE id = ?', ['True', str(id)])
-            self.base.commit()
+            self.execute('UPDATE users SET ban = 1 WHERE id = ?', [int(id)])
+            user_status.update(int(id), banned=True)
             return True
 
         except Exception as e:
             print(f'Ошибка рип бане пользователя: {e}')
             return False
 
-    
+
     def anti_ban_user_to_db(self, id):
 
         try:
-            self.cur.execute(f'UPDATE users SET ban = ? WHERE id = ?', ['None', str(id)])
-            self.base.commit()
+            self.execute('UPDATE users SET ban = 0 WHERE id = ?', [int(id)])
+            user_status.update(int(id), banned=False)
             return True
 
         except Exception as e:
@@ -267,10 +544,36 @@ class DB(object):
             return False
 
 
+    def load_user_flags(self, id):
+
+        #None - пользователя нет в базе, это тоже кэшируется до add_user;
+        #если пока читали, флаги поменяли (бан, деактивация), put ничего не положит
+        since = user_status.generation()
+        req = self.fetchone('SELECT ban, active, last_seen FROM users WHERE id = ?', [int(id)])
+        flags = UserFlags(banned=bool(req[0]), active=bool(req[1]), last_seen=req[2]) if req else None
+        user_status.put(int(id), flags, since=since)
+        return flags
+
+    def touch_user(self, id):
+
+        #запись уходит в групповую транзакцию, ждать ее не нужно
+        now = int(time.time())
+        user_status.update(int(id), last_seen=now)
+        return self.submit('UPDATE users SET last_seen = ? WHERE id = ?', [now, int(id)])
+
+    def user_flags(self, id):
+
+        flags = user_status.get(int(id))
+
+        if flags is NOT_CACHED:
+            flags = self.load_user_flags(id)
+
+        return flags
+
     def search_ban_user(self, id):
         try:
-            req = self.cur.execute('SELECT ban FROM users WHERE id = ?', [str(id)]).fetchone()
-            return req
+            flags = self.user_flags(id)
+            return None if flags is None else (int(flags.banned),)
         except Exception as e:
             print(f'ОШибка при поиске айди бана:{e}')
 
@@ -278,9 +581,9 @@ class DB(object):
     def add_valute(self, valute, type, min, max, requisite):
 
         try:
-            self.cur.execute('INSERT INTO valute VALUES(?, ?, ?, ?, ?)',
+            self.execute('INSERT INTO valute(name, type, minimal, maximal, requisite) VALUES(?, ?, ?, ?, ?)',
                             [valute, type, min, max, requisite])
-            self.base.commit()
+            catalog_cache.bump()
             return True
 
         except Exception as e:
@@ -291,7 +594,7 @@ class DB(object):
     def give_keyboard_valute(self, type_valute):
 
         try:
-            req = self.cur.execute('SELECT name, type FROM valute WHERE type = ?', [type_valute]).fetchall()
+            req = [(log[0], log[1]) for log in self.catalog().valute if log[1] == type_valute]
             return req
 
         except Exception as e:
@@ -299,9 +602,9 @@ class DB(object):
             return False
 
     def give_info_valute(self, name):
-        
+
         try:
-            req = self.cur.execute('SELECT requisite FROM valute WHERE name = ?', [name]).fetchall()
+            req = [(log[4],) for log in self.catalog().valute if log[0] == name]
             return req
 
         except Exception as e:
@@ -311,8 +614,8 @@ class DB(object):
     def delete_valute(self, name):
 
         try:
-            self.cur.execute('DELETE FROM valute WHERE name = ?', [name])
-            self.base.commit()
+            self.execute('DELETE FROM valute WHERE name = ?', [name])
+            catalog_cache.bump()
             return True
 
         except Exception as e:
@@ -323,7 +626,7 @@ class DB(object):
     def give_min_and_max(self, name):
 
         try:
-            req = self.cur.execute('SELECT minimal, maximal FROM valute WHERE name = ?', [name]).fetchall()
+            req = [(log[2], log[3]) for log in self.catalog().valute if log[0] == name]
             return req
 
         except Exception as e:
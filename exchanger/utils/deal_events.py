@@ -0,0 +1,102 @@
+import time
+import asyncio
+import logging
+from data.config import DEAL_EVENTS_BATCH, DEAL_EVENTS_FLUSH_SECONDS, DEAL_ID_BLOCK
+from utils.async_database import AsyncDB
+
+
+#этапы сделки с отметками времени: пишутся пачками, чтобы клики по кнопкам не ждали базу
+
+logger = logging.getLogger(__name__)
+
+#этап -> от какого этапа считать время
+DURATIONS = {
+    'approve': ('submitted', 'approved'),
+    'pay': ('approved', 'paid'),
+    'complete': ('submitted', 'completed'),
+}
+
+
+class DealEvents(object):
+    """
+    id заявок выдаются блоками по DEAL_ID_BLOCK (hi/lo): в базе хранится только номер
+    последнего взятого блока, так что после падения id не повторяются.
+    """
+
+    def __init__(self, batch=DEAL_EVENTS_BATCH, flush_every=DEAL_EVENTS_FLUSH_SECONDS, block=DEAL_ID_BLOCK):
+        self.batch = batch
+        self.flush_every = flush_every
+        self.block = block
+        self._next = 0
+        self._limit = 0
+        self._buffer = []
+        self._lock = asyncio.Lock()
+        self._flusher = None
+
+    async def next_id(self):
+
+        async with self._lock:
+            if self._next >= self._limit:
+                async with AsyncDB() as db:
+                    hi = await db.reserve_deal_id_block()
+
+                self._next, self._limit = hi * self.block, (hi + 1) * self.block
+
+            self._next += 1
+            return self._next
+
+    async def record(self, app_id, stage, pair):
+
+        if app_id is None:
+            #кнопки, отправленные до появления id заявок
+            return
+
+        self._buffer.append((int(app_id), stage, pair, int(time.time())))
+
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+        if len(self._buffer) >= self.batch:
+            await self.flush()
+
+    async def flush(self):
+
+        events, self._buffer = self._buffer, []
+
+        if events:
+            async with AsyncDB() as db:
+                await db.add_deal_events(events)
+
+    async def _flush_periodically(self):
+
+        while True:
+            await asyncio.sleep(self.flush_every)
+
+            try:
+                await self.flush()
+
+            except Exception as e:
+                logger.error(f'Ошибка при записи этапов сделок: {e}')
+
+    async def durations(self, days):
+
+        #{пара: {'approve': [секунды по возрастанию], ...}} за последние days дней
+        await self.flush()
+        since = int(time.time()) - days * 86400
+        result = {}
+
+        async with AsyncDB() as db:
+            for name, (start, end) in DURATIONS.items():
+                for pair, seconds in await db.give_deal_durations(start, end, since):
+                    result.setdefault(pair, {}).setdefault(name, []).append(seconds)
+
+        return result
+
+
+deal_events = DealEvents()
+
+
+def percentile(values, p):
+
+    #nearest-rank по уже отсортированному списку
+    return values[max(0, min(len(values) - 1, -(-len(values) * p // 100) - 1))]
@@ -0,0 +1,87 @@
+import os
+import csv
+import gzip
+import tempfile
+from datetime import datetime
+from data.config import EXPORT_MAX_MB
+from utils.async_database import AsyncDB
+from utils.statistic_func import TZ
+from utils import analytics
+
+
+#выгрузка таблиц в csv: строки идут генератором из базы прямо во временный файл
+
+
+def history_rows(db, start=None, end=None, valute=None, user=None):
+
+    where, params = [], []
+
+    if start is not None:
+        where.append('data >= ? AND data < ?')
+        params += [int(start), int(end)]
+
+    if valute is not None:
+        where.append('exchange = ?')
+        params.append(valute)
+
+    if user is not None:
+        where.append('id = ?')
+        params.append(int(user))
+
+    sql = 'SELECT data, amount, id, exchange FROM history'
+
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+
+    yield ['date', 'amount', 'user_id', 'exchange']
+
+    for data, amount, id, exchange in db.iterate(sql + ' ORDER BY data', params):
+        yield [datetime.fromtimestamp(data, TZ).isoformat(sep=' '), amount, id, exchange]
+
+
+def user_rows(db):
+
+    yield ['id', 'name_user', 'username', 'ban', 'active', 'last_seen']
+
+    for id, name_user, username, ban, active, last_seen in db.iterate('SELECT id, name_user, username, ban, active, last_seen FROM users ORDER BY id'):
+        seen = datetime.fromtimestamp(last_seen, TZ).isoformat(sep=' ') if last_seen else ''
+        yield [id, name_user, username, ban, active, seen]
+
+
+def write_csv(rows, gz=False):
+
+    #путь к временному файлу, удалить его после отправки - забота вызывающего
+    fd, path = tempfile.mkstemp(suffix='.csv.gz' if gz else '.csv')
+    os.close(fd)
+
+    try:
+        with (gzip.open(path, 'wt', newline='', encoding='utf-8') if gz else open(path, 'w', newline='', encoding='utf-8')) as f:
+            csv.writer(f).writerows(rows)
+
+    except Exception:
+        os.remove(path)
+        raise
+
+    return path
+
+
+async def export(name, rows_func, *args, gz=False):
+
+    #(путь, имя файла для телеграма, влезает ли в лимит документа)
+    async with AsyncDB() as db:
+        path = await db.run(lambda: write_csv(rows_func(db.db, *args), gz=gz))
+
+    filename = f'{name}_{datetime.now(TZ):%Y%m%d_%H%M}.csv' + ('.gz' if gz else '')
+    return path, filename, os.path.getsize(path) <= EXPORT_MAX_MB * 1024 * 1024
+
+
+async def export_history(start=None, end=None, valute=None, user=None, gz=False):
+    return await export('history', history_rows, start, end, valute, user, gz=gz)
+
+
+async def export_users(gz=False):
+    return await export('users', user_rows, gz=gz)
+
+
+async def export_analytics(kind, gz=False):
+    return await export(f'analytics_{kind}', analytics.rows, kind, gz=gz)
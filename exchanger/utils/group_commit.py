@@ -0,0 +1,119 @@
+import time
+import queue
+import threading
+import logging
+from concurrent.futures import Future
+from data.config import DB_COMMIT_WINDOW_MS
+
+
+#групповой коммит: записи, пришедшие в пределах нескольких мс, уходят в базу одной транзакцией
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class GroupCommitWriter(object):
+    def __init__(self, manager, window_ms=DB_COMMIT_WINDOW_MS, max_batch=256):
+        self.manager = manager
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, func):
+        """
+        Ставит func(cur) в очередь на запись.
+        Future завершается только после коммита транзакции, в которую попала запись.
+        """
+        self._ensure_started()
+
+        future = Future()
+        self._queue.put((future, func))
+        return future
+
+    def _ensure_started(self):
+
+        if self._thread is not None:
+            return
+
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+
+        stop = False
+
+        while not stop:
+            job = self._queue.get()
+
+            if job is _STOP:
+                break
+
+            batch = [job]
+            deadline = time.monotonic() + self.window
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+
+                try:
+                    job = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+
+                except queue.Empty:
+                    break
+
+                if job is _STOP:
+                    stop = True
+                    break
+
+                batch.append(job)
+
+            self._commit(batch)
+
+    def _commit(self, batch):
+
+        results = []
+
+        try:
+            with self.manager.writer() as cur:
+                cur.execute('BEGIN')
+
+                for future, func in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+
+                    #каждая запись в своем savepoint, чтобы ошибка одной не откатывала остальные
+                    cur.execute('SAVEPOINT job')
+                    try:
+                        results.append((future, func(cur), None))
+                        cur.execute('RELEASE job')
+
+                    except Exception as e:
+                        cur.execute('ROLLBACK TO job')
+                        cur.execute('RELEASE job')
+                        results.append((future, None, e))
+
+        except Exception as e:
+            logger.exception('Ошибка при групповом коммите')
+
+            for future, func in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+
+            else:
+                future.set_exception(error)
+
+    def stop(self):
+
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
@@ -1,15 +1,18 @@
 from aiogram.dispatcher.middlewares import BaseMiddleware
 from aiogram import types
 from aiogram.types import *
-from utils.database import *
+from data.config import *
+from utils.async_database import *
+from utils.cache import membership
 from loader import dp, bot
 from keyboards import inline_keyboards as ikb
 from aiogram.utils.exceptions import Throttled
 from aiogram.dispatcher import DEFAULT_RATE_LIMIT
 from aiogram.contrib.fsm_storage.redis import RedisStorage2
+import time
 import asyncio
 from loader import *
-from aiogram.dispatcher.handler import CancelHandler, current_handler
+from aiogram.dispatcher.handler import CancelHandler
 
 #Разработчики: https://t.me/weaseldev @weaseldev
 
@@ -41,33 +44,34 @@ class ThrottlingMiddleware(BaseMiddleware):
 
     async def on_process_callback_query(self, call: types.CallbackQuery, data: dict):
 
-        handler = current_handler.get()
-
         dispatcher = Dispatcher.get_current()
-        
-        if handler:
-            limit = getattr(handler, 'throttling_rate_limit', self.rate_limit)
-            key = getattr(handler, 'throttling_key', f"{self.prefix}_{handler.__name__}")
-        else:
-            limit = self.rate_limit
-            key = f"{self.prefix}_message"
+
+        #все коллбеки идут через router.dispatch, поэтому обработчик берем из найденного маршрута
+        limit, key = self.throttling(data.get('route'))
 
         try:
             await dispatcher.throttle(key, rate=limit)
         except Throttled as t:
           
-            await self.message_throttled(call, t)
+            await self.message_throttled(call, t, data)
 
             raise CancelHandler()
+
+    def throttling(self, route):
+
+        if route is None:
+            return self.rate_limit, f"{self.prefix}_message"
+
+        limit = getattr(route.handler, 'throttling_rate_limit', self.rate_limit)
+        #ключ по обработчику, а не по префиксу: у разных шагов бывает общий префикс (оба выбора валюты - 'e:')
+        key = getattr(route.handler, 'throttling_key', f"{self.prefix}_{route.handler.__module__}.{route.handler.__qualname__}")
+        return limit, key
+
 #Разработчики: https://t.me/weaseldev @weaseldev
-    async def message_throttled(self, call: types.CallbackQuery, throttled: Throttled):
+    async def message_throttled(self, call: types.CallbackQuery, throttled: Throttled, data: dict):
 
-        handler = current_handler.get()
         dispatcher = Dispatcher.get_current()
-        if handler:
-            key = getattr(handler, 'throttling_key', f"{self.prefix}_{handler.__name__}")
-        else:
-            key = f"{self.prefix}_message"
+        limit, key = self.throttling(data.get('route'))
 
         delta = throttled.rate - throttled.delta
 
@@ -84,163 +88,140 @@ class ThrottlingMiddleware(BaseMiddleware):
 
 
 
-class OffMessage(BaseMiddleware):
-    async def on_process_message(self, msg: types.Message, data: dict):
+class UserContext(object):
+    """
+    Все, что мидлварь узнала о пользователе за один проход. Попадает в data['user_ctx'],
+    хендлер может получить его, объявив аргумент user_ctx.
+    """
 
-        for i in ADMIN_ID:
-            if i == msg.from_id:
-                pass
-            else:
-                with DB() as db:
-                    r = db.give_status_bot()
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.is_admin = user_id in ADMIN_ID
+        self.status = None
+        self.banned = None
+        self.active = None
+        self.subscribed = None
+        self.banner = None
 
-                if r[0][1] == 'on':
-                    pass
-                else:
-                    await msg.answer('🛑 Бот отключен ')
-                    raise CancelHandler
-                break
+#Разработчики: https://t.me/weaseldev @weaseldev
 
 
-class OffCallback(BaseMiddleware):
-    async def on_process_callback_query(self, call: types.CallbackQuery, data: dict):
-        #Разработчики: https://t.me/weaseldev @weaseldev
-        for i in ADMIN_ID:
-            if i == call.from_user.id:
-                pass
-            else:
-                with DB() as db:
-                    r = db.give_status_bot()
-
-                if r[0][1] == 'on':
-                    pass
-                else:
-                    await call.answer('🛑 Бот отключен ', show_alert=True)
-                    raise CancelHandler
+class Gatekeeper(BaseMiddleware):
+    """
+    Заменяет OffMessage/OffCallback, SearchBanUser*, Ads и SubsribeOnChannel*:
+    проверки идут в порядке GATEKEEPER_CHECKS, первая не пройденная отменяет апдейт.
+    """
 
-                break
-#Разработчики: https://t.me/weaseldev @weaseldev
+    def __init__(self, checks=GATEKEEPER_CHECKS):
+        self.checks = [getattr(self, f'check_{name.strip()}') for name in checks if name.strip()]
+        super(Gatekeeper, self).__init__()
 
+    async def on_pre_process_message(self, msg: types.Message, data: dict):
+        await self.run_checks(msg, data)
 
-class Ads(BaseMiddleware):
-    async def on_process_callback_query(self, call: types.CallbackQuery, data: dict):
+    async def on_pre_process_callback_query(self, call: types.CallbackQuery, data: dict):
+        await self.run_checks(call, data)
+
+    async def run_checks(self, event, data):
 
-        with DB() as db:
-            r = db.search_ban_user(id=call.from_user.id)
-        
-        if str(r[0]) == 'True':
-            await call.answer('Вы забанены!', show_alert=True)
-            raise CancelHandler
+        ctx = UserContext(event.from_user.id)
+        data['user_ctx'] = ctx
+
+        async with AsyncDB() as db:
+            for check in self.checks:
+                if not await check(db, event, ctx):
+                    raise CancelHandler
+
+    async def reply(self, event, text):
+
+        if isinstance(event, types.CallbackQuery):
+            await event.answer(text, show_alert=True)
 
         else:
-            if call.data == 'exchange':
+            await event.answer(text)
 
-                with DB() as db:
-                    r = db.give_banner()
+    async def check_status(self, db, event, ctx):
 
-                if str(r) == '[]':
-                    pass
+        ctx.status = (await db.settings()).status
 
-                else:
+        if ctx.is_admin or ctx.status == 'on':
+            return True
 
-                    text = r[0][1]
-                    
-                    await call.answer(text, show_alert=True)
-#Разработчики: https://t.me/weaseldev @weaseldev
+        await self.reply(event, '🛑 Бот отключен ')
+        return False
 
-class SearchBanUserCallback(BaseMiddleware):
-    async def pre_process_callback_query(self, call: types.CallbackQuery, data: dict):
-        try:
-            with DB() as db:
-                r = db.search_ban_user(id=call.from_user.id)
-            
-            if str(r[0]) == 'True':
-                await call.answer('Вы забанены!', show_alert=True)
-                raise CancelHandler
-
-            else:
-                pass
-        except:
-            pass
-
-class SearchBanUserMessage(BaseMiddleware):
-    async def on_process_message(self, msg: types.Message, data: dict):
-        
-        try:
-            with DB() as db:
-                r = db.search_ban_user(id=msg.from_user.id)
-            
-            if str(r[0]) == 'True':
-                await msg.answer('Вы забанены!')
-                raise CancelHandler
-
-            else:
-                pass
-        except CancelHandler as e:
-            pass
-            
-      #Разработчики: https://t.me/weaseldev @weaseldev  
-class SubsribeOnChannelMessage(BaseMiddleware):
-    async def on_process_message(self, msg: types.Message, data: dict):
-
-        with DB() as db:
-            channel_list = db.give_list_channel()
-
-    
-
-        if str(channel_list) != '[]':
-            
-            url_list = []
-
-            for i in channel_list:
-                url_list.append(i[1])
+    async def check_ban(self, db, event, ctx):
 
-#Разработчики: https://t.me/weaseldev @weaseldev
+        flags = await db.user_flags(ctx.user_id)
 
-            for channel in channel_list:
-                channel_id = channel[0]
-                chat_link = channel[1].replace('https://t.me/', '@')
-             
-                user_channel_status = await bot.get_chat_member(chat_id=channel_id, user_id=msg.from_id)
-                if user_channel_status["status"] != 'left':
-                    pass
-                else:
-                    await bot.send_message(msg.from_user.id, '⁉️ Вы не подписались на один из каналов ниже, подпишитесь и нажмите на /start что бы продолжить пользоваться ботом!', reply_markup=ikb.channel_list(url_list))
-                    raise CancelHandler
-                    break
+        if flags is None:
+            #пользователь еще не нажал /start
+            return True
 
-        else:
-            pass
+        ctx.banned, ctx.active = flags.banned, flags.active
 
+        if not ctx.banned:
+            return True
 
-class SubsribeOnChannelCallback(BaseMiddleware):
-    async def on_process_callback_query(self, call: types.CallbackQuery, data: dict):
+        await self.reply(event, 'Вы забанены!')
+        return False
 
-        with DB() as db:
-            channel_list = db.give_list_channel()
+    async def check_seen(self, db, event, ctx):
 
-  #Разработчики: https://t.me/weaseldev @weaseldev
-        if str(channel_list) != '[]':
-            
-            url_list = []
+        #время визита нужно только для сегментов рассылки, поэтому пишем не чаще раза в SEEN_RESOLUTION
+        flags = await db.user_flags(ctx.user_id)
 
-            for i in channel_list:
-                url_list.append(i[1])
+        if flags is not None and (flags.last_seen or 0) < time.time() - SEEN_RESOLUTION:
+            await db.touch_user(ctx.user_id)
 
+        return True
 
+    async def check_banner(self, db, event, ctx):
 
-            for channel in channel_list:
-                channel_id = channel[0]
-                chat_link = channel[1].replace('https://t.me/', '@')
-                
-                user_channel_status = await bot.get_chat_member(chat_id=channel_id, user_id=call.from_user.id)
-                if user_channel_status["status"] != 'left':
-                    pass
-                else:
-                    await bot.send_message(call.from_user.id, '⁉️ Вы не подписались на один из каналов ниже, подпишитесь и нажмите на /start что бы продолжить пользоваться ботом!', reply_markup=ikb.channel_list(url_list))
-                    
-                    raise CancelHandler
-                    break
+        ctx.banner = (await db.settings()).banner
+
+        if ctx.banner and isinstance(event, types.CallbackQuery) and event.data == 'exchange':
+            await event.answer(ctx.banner, show_alert=True)
+
+        return True
+
+    async def check_subscription(self, db, event, ctx):
+
+        channel_list = await db.give_list_channel()
+
+        #после подписки пользователя просят нажать /start - тут кэшу не верим
+        fresh = isinstance(event, types.Message) and (event.text or '').startswith('/start')
+        ctx.subscribed = not channel_list or await is_subscribed(ctx.user_id, channel_list, fresh=fresh)
+
+        if ctx.subscribed:
+            return True
+
+        url_list = [i[1] for i in channel_list]
 #Разработчики: https://t.me/weaseldev @weaseldev
-        else:
-            pass
\ No newline at end of file
+        await bot.send_message(ctx.user_id, '⁉️ Вы не подписались на один из каналов ниже, подпишитесь и нажмите на /start что бы продолжить пользоваться ботом!', reply_markup=ikb.channel_list(url_list))
+        return False
+
+
+async def is_subscribed(user_id, channel_list, fresh=False):
+
+    #сначала смотрим в кэш, недостающие каналы проверяем одновременно, а не по очереди
+    misses = []
+
+    for channel in channel_list:
+        subscribed = None if fresh else membership.get(user_id, channel[0])
+
+        if subscribed is None:
+            misses.append(channel)
+
+        elif not subscribed:
+            return False
+
+    if misses:
+        statuses = await asyncio.gather(*[bot.get_chat_member(chat_id=channel[0], user_id=user_id) for channel in misses])
+
+        for channel, user_channel_status in zip(misses, statuses):
+            membership.put(user_id, channel[0], user_channel_status["status"] != 'left')
+
+        return all(user_channel_status["status"] != 'left' for user_channel_status in statuses)
+
+    return True
@@ -0,0 +1,287 @@
+import time
+import logging
+from data.config import DB_PATH, TIMEZONE
+from utils.connection import get_manager
+from utils.statistic_func import GRANULARITIES, period_start
+from zoneinfo import ZoneInfo
+
+
+#версионные миграции схемы базы, запускаются один раз при старте бота
+
+logger = logging.getLogger(__name__)
+
+
+def initial_schema(cur):
+
+    cur.execute("""CREATE TABLE IF NOT EXISTS users(
+                id PRIMARY KEY,
+                name_user TEXT,
+                username TEXT,
+                ban TEXT,
+                active TEXT)""")
+    cur.execute('CREATE TABLE IF NOT EXISTS payment_method(name TEXT PRIMARY KEY, type TEXT)')
+    cur.execute('CREATE TABLE IF NOT EXISTS valute(name TEXT PRIMARY KEY, type TEXT, minimal TEXT, maximal TEXT, requisite TEXT)')
+    cur.execute('CREATE TABLE IF NOT EXISTS chanel(id_channel TEXT PRIMARY KEY, url TEXT)')
+    cur.execute('CREATE TABLE IF NOT EXISTS banner(id TEXT PRIMARY KEY, text TEXT)')
+    cur.execute('CREATE TABLE IF NOT EXISTS status_active(id TEXT PRIMARY KEY, status TEXT)')
+    cur.execute('INSERT OR IGNORE INTO status_active VALUES(?, ?)', ['1', 'on'])
+    cur.execute('CREATE TABLE IF NOT EXISTS history(amount TEXT, id TEXT, exchange TEXT, data TEXT)')
+
+
+def typed_columns(cur):
+
+    #users: id как INTEGER PRIMARY KEY (алиас rowid), ban/active как 0/1 вместо 'True'/'None' и '1'/'0'
+    cur.execute("""CREATE TABLE users_new(
+                id INTEGER PRIMARY KEY,
+                name_user TEXT,
+                username TEXT,
+                ban INTEGER NOT NULL DEFAULT 0,
+                active INTEGER NOT NULL DEFAULT 1)""")
+    cur.execute("""INSERT OR IGNORE INTO users_new
+                SELECT CAST(id AS INTEGER), name_user, username,
+                       CASE WHEN ban = 'True' THEN 1 ELSE 0 END,
+                       CASE WHEN active = '0' THEN 0 ELSE 1 END
+                FROM users WHERE CAST(id AS INTEGER) != 0""")
+    cur.execute('DROP TABLE users')
+    cur.execute('ALTER TABLE users_new RENAME TO users')
+
+    #history: сумма числом, id пользователя INTEGER, дата 'YYYY-MM-DD-неделя' -> unix time начала дня (UTC)
+    cur.execute('CREATE TABLE history_new(amount NUMERIC NOT NULL, id INTEGER, exchange TEXT, data INTEGER NOT NULL)')
+    cur.execute("""INSERT INTO history_new
+                SELECT amount, CAST(id AS INTEGER), exchange,
+                       CAST(strftime('%s', substr(data, 1, 10)) AS INTEGER)
+                FROM history""")
+    cur.execute('DROP TABLE history')
+    cur.execute('ALTER TABLE history_new RENAME TO history')
+
+    #valute: минимум и максимум числами
+    cur.execute('CREATE TABLE valute_new(name TEXT PRIMARY KEY, type TEXT, minimal NUMERIC, maximal NUMERIC, requisite TEXT)')
+    cur.execute('INSERT INTO valute_new SELECT name, type, minimal, maximal, requisite FROM valute')
+    cur.execute('DROP TABLE valute')
+    cur.execute('ALTER TABLE valute_new RENAME TO valute')
+
+    cur.execute('CREATE INDEX IF NOT EXISTS history_data ON history(data)')
+    cur.execute('CREATE INDEX IF NOT EXISTS history_exchange ON history(exchange)')
+    cur.execute('CREATE INDEX IF NOT EXISTS history_id ON history(id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS users_active ON users(active)')
+    cur.execute('CREATE INDEX IF NOT EXISTS users_ban ON users(ban)')
+    cur.execute('CREATE INDEX IF NOT EXISTS payment_method_type ON payment_method(type)')
+    cur.execute('CREATE INDEX IF NOT EXISTS valute_type ON valute(type)')
+
+
+def broadcast_jobs(cur):
+
+    #рассылки как задания: cursor - id пользователя, до которого включительно все уже обработано
+    cur.execute("""CREATE TABLE IF NOT EXISTS broadcast_jobs(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                text TEXT,
+                file_id TEXT,
+                admin_id INTEGER,
+                status TEXT NOT NULL,
+                cursor INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                sent INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                created INTEGER,
+                updated INTEGER)""")
+    cur.execute('CREATE INDEX IF NOT EXISTS broadcast_jobs_status ON broadcast_jobs(status)')
+
+
+def recipient_segments(cur):
+
+    #время последнего визита для сегмента "заходили недавно", у старых пользователей неизвестно (NULL)
+    cur.execute('ALTER TABLE users ADD COLUMN last_seen INTEGER')
+    cur.execute('CREATE INDEX IF NOT EXISTS users_last_seen ON users(last_seen)')
+    cur.execute("ALTER TABLE broadcast_jobs ADD COLUMN segment TEXT NOT NULL DEFAULT 'all'")
+
+
+def covering_history_indexes(cur):
+
+    #суммы по обменам считаются прямо по индексу, без чтения самой таблицы
+    cur.execute('DROP INDEX IF EXISTS history_exchange')
+    cur.execute('DROP INDEX IF EXISTS history_data')
+    cur.execute('CREATE INDEX IF NOT EXISTS history_exchange_amount ON history(exchange, amount)')
+    cur.execute('CREATE INDEX IF NOT EXISTS history_data_exchange ON history(data, exchange, amount)')
+
+
+def rebuild_rollup(cur, timezone=TIMEZONE):
+
+    #история сначала сворачивается по 15 минут в SQL - любой часовой пояс сдвигает границы
+    #кратно 15 минутам, так что дальше в питоне считаются только эти корзины, а не все строки
+    tz = ZoneInfo(timezone)
+    cur.execute('DELETE FROM history_rollup')
+    buckets = cur.execute('SELECT data / 900 * 900, exchange, TOTAL(amount), COUNT(*) FROM history GROUP BY 1, 2').fetchall()
+
+    rollup = {}
+
+    for ts, exchange, amount, deals in buckets:
+        for granularity in GRANULARITIES:
+            key = (granularity, period_start(ts, granularity, tz), exchange)
+            total = rollup.get(key, (0.0, 0))
+            rollup[key] = (total[0] + amount, total[1] + deals)
+
+    cur.executemany('INSERT INTO history_rollup VALUES(?, ?, ?, ?, ?)', [(*key, *value) for key, value in rollup.items()])
+    cur.execute("INSERT OR REPLACE INTO meta VALUES('rollup_timezone', ?)", [timezone])
+
+
+def history_rollup(cur):
+
+    #суммы и число сделок по (период, начало периода, обмен), add_history обновляет их в той же транзакции
+    cur.execute("""CREATE TABLE IF NOT EXISTS history_rollup(
+                granularity TEXT NOT NULL,
+                period_start INTEGER NOT NULL,
+                exchange TEXT NOT NULL,
+                amount REAL NOT NULL DEFAULT 0,
+                deals INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY(granularity, period_start, exchange)) WITHOUT ROWID""")
+    cur.execute('CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value TEXT)')
+    rebuild_rollup(cur)
+
+
+def user_counters(cur):
+
+    #счетчики пользователей ведут триггеры, так что их не обойти ни одним UPDATE, включая пачки из рассылки
+    cur.execute("""CREATE TABLE IF NOT EXISTS user_counters(
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                total INTEGER NOT NULL,
+                active INTEGER NOT NULL,
+                banned INTEGER NOT NULL)""")
+    cur.execute('INSERT OR REPLACE INTO user_counters SELECT 1, COUNT(*), TOTAL(active), TOTAL(ban) FROM users')
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS users_counters_insert AFTER INSERT ON users BEGIN
+                UPDATE user_counters SET total = total + 1, active = active + NEW.active, banned = banned + NEW.ban;
+                END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS users_counters_delete AFTER DELETE ON users BEGIN
+                UPDATE user_counters SET total = total - 1, active = active - OLD.active, banned = banned - OLD.ban;
+                END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS users_counters_update AFTER UPDATE OF active, ban ON users BEGIN
+                UPDATE user_counters SET active = active + NEW.active - OLD.active, banned = banned + NEW.ban - OLD.ban;
+                END""")
+
+
+def deal_events(cur):
+
+    #этапы сделки: submitted, approved/rejected, paid/user_cancelled, completed/cancelled
+    cur.execute("""CREATE TABLE IF NOT EXISTS deal_events(
+                app_id INTEGER NOT NULL,
+                stage TEXT NOT NULL,
+                pair TEXT,
+                ts INTEGER NOT NULL,
+                PRIMARY KEY(app_id, stage)) WITHOUT ROWID""")
+    cur.execute('CREATE INDEX IF NOT EXISTS deal_events_stage_ts ON deal_events(stage, ts)')
+
+
+def applications(cur):
+
+    #заявки на обмен: кнопки несут только id, статус меняется одним UPDATE с проверкой текущего
+    cur.execute("""CREATE TABLE IF NOT EXISTS applications(
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                username TEXT,
+                full_name TEXT,
+                valute_from TEXT NOT NULL,
+                valute_to TEXT NOT NULL,
+                payment_method TEXT,
+                amount NUMERIC NOT NULL,
+                requisites TEXT,
+                comment TEXT,
+                status TEXT NOT NULL,
+                created INTEGER NOT NULL,
+                updated INTEGER NOT NULL)""")
+    cur.execute('CREATE INDEX IF NOT EXISTS applications_status ON applications(status)')
+    cur.execute('CREATE INDEX IF NOT EXISTS applications_user_id ON applications(user_id)')
+
+
+def broadcast_deactivated(cur):
+
+    #неактивные считаются отдельно от ошибок и должны переживать перезапуск вместе с sent/failed
+    cur.execute('ALTER TABLE broadcast_jobs ADD COLUMN deactivated INTEGER NOT NULL DEFAULT 0')
+
+
+def catalog_ids(cur):
+
+    #свой id с AUTOINCREMENT: неявный rowid после удаления последней строки выдается заново,
+    #и старая кнопка указала бы на новую валюту. Старые rowid переносятся как id, уже отправленные кнопки остаются рабочими
+    cur.execute("""CREATE TABLE valute_new(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE,
+                type TEXT,
+                minimal NUMERIC,
+                maximal NUMERIC,
+                requisite TEXT)""")
+    cur.execute("""INSERT INTO valute_new(id, name, type, minimal, maximal, requisite)
+                SELECT rowid, name, type, minimal, maximal, requisite FROM valute ORDER BY rowid""")
+    cur.execute('DROP TABLE valute')
+    cur.execute('ALTER TABLE valute_new RENAME TO valute')
+    cur.execute('CREATE INDEX IF NOT EXISTS valute_type ON valute(type)')
+
+    cur.execute("""CREATE TABLE payment_method_new(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE,
+                type TEXT)""")
+    cur.execute('INSERT INTO payment_method_new(id, name, type) SELECT rowid, name, type FROM payment_method ORDER BY rowid')
+    cur.execute('DROP TABLE payment_method')
+    cur.execute('ALTER TABLE payment_method_new RENAME TO payment_method')
+    cur.execute('CREATE INDEX IF NOT EXISTS payment_method_type ON payment_method(type)')
+
+
+#(версия, описание, функция) - порядок важен, версии только растут
+MIGRATIONS = [
+    (1, 'начальная схема', initial_schema),
+    (2, 'типизированные колонки и индексы', typed_columns),
+    (3, 'задания рассылки', broadcast_jobs),
+    (4, 'сегменты получателей рассылки', recipient_segments),
+    (5, 'покрывающие индексы истории', covering_history_indexes),
+    (6, 'сводки истории по периодам', history_rollup),
+    (7, 'счетчики пользователей', user_counters),
+    (8, 'этапы сделок', deal_events),
+    (9, 'заявки на обмен', applications),
+    (10, 'неактивные в заданиях рассылки', broadcast_deactivated),
+    (11, 'id валют и методов выплат', catalog_ids),
+]
+
+
+def current_version(cur):
+
+    cur.execute("""CREATE TABLE IF NOT EXISTS schema_version(
+                version INTEGER PRIMARY KEY,
+                name TEXT,
+                applied INTEGER)""")
+    r = cur.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return r[0] or 0
+
+
+def migrate(db_fp=DB_PATH):
+
+    pool = get_manager(db_fp)
+
+    with pool.writer() as cur:
+        version = current_version(cur)
+
+    for number, name, func in MIGRATIONS:
+        if number <= version:
+            continue
+
+        logger.info(f'Применяю миграцию {number}: {name}')
+
+        with pool.writer() as cur:
+            cur.execute('BEGIN')
+            func(cur)
+            cur.execute('INSERT INTO schema_version VALUES(?, ?, ?)', [number, name, int(time.time())])
+
+        version = number
+
+    ensure_rollup_timezone(pool)
+    return version
+
+
+def ensure_rollup_timezone(pool, timezone=TIMEZONE):
+
+    #границы периодов зависят от часового пояса - если TIMEZONE поменяли, сводки пересчитываются
+    with pool.writer() as cur:
+        r = cur.execute("SELECT value FROM meta WHERE key = 'rollup_timezone'").fetchone()
+
+        if r is None or r[0] != timezone:
+            logger.info(f'Пересчитываю сводки истории под часовой пояс {timezone}')
+            cur.execute('BEGIN')
+            rebuild_rollup(cur, timezone)
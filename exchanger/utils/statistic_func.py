@@ -1,135 +1,199 @@
-from datetime import date
-import datetime
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+from data.config import TIMEZONE
 
 
-def all_stat(db_list):
+#суммы лежат в history_rollup по дням, неделям и месяцам, здесь только границы периодов и текст
 
-	name_staff = []
+TZ = ZoneInfo(TIMEZONE)
 
-	for log in db_list:
+GRANULARITIES = ('day', 'week', 'month')
 
-		name_staff.append(log[2])
+PERIOD_TITLES = {
+	'day': '➕За день:',
+	'week': '➕За неделю:',
+	'month': '➕За месяц:',
+}
 
-	clear_name_staff = list(set(name_staff))
 
-	text_return = '➕ Профит: '
+def period_start(ts, granularity, tz=TZ):
+
+	#начало дня/недели (с понедельника)/месяца, в который попадает ts, в unix time
+	day = datetime.fromtimestamp(ts, tz).date()
+
+	if granularity == 'week':
+		day -= timedelta(days=day.weekday())
+
+	elif granularity == 'month':
+		day = day.replace(day=1)
+
+	elif granularity != 'day':
+		raise ValueError(f'Неизвестный период: {granularity}')
+
+	return int(datetime.combine(day, datetime.min.time(), tz).timestamp())
+
+
+def current_period(granularity, tz=TZ):
+
+	return period_start(datetime.now(tz).timestamp(), granularity, tz)
+
+
+REPORT_USAGE = '''Использование:
+/report 2024-01-01 2024-01-31 [valute=BTC] [user=123456]
+
+Даты включительно, конец можно не указывать - тогда по сегодня.'''
+
+
+def parse_report_args(args, tz=TZ, require_dates=True):
+
+	#'2024-01-01 2024-01-31 valute=BTC user=1' -> (начало, конец, валюта, пользователь), конец не включается
+	dates, valute, user = [], None, None
+
+	for arg in args.split():
+
+		if arg.startswith('valute='):
+			valute = arg.replace('valute=', '', 1)
+
+		elif arg.startswith('user='):
+			user = int(arg.replace('user=', '', 1))
+
+		else:
+			dates.append(date.fromisoformat(arg))
+
+	if not dates and not require_dates:
+		return None, None, valute, user
+
+	if not dates or len(dates) > 2:
+		raise ValueError('Нужны одна или две даты')
 
-	for name in clear_name_staff:
+	start = dates[0]
+	end = dates[1] if len(dates) == 2 else datetime.now(tz).date()
 
+	if end < start:
+		raise ValueError('Конец раньше начала')
 
+	return (int(datetime.combine(start, datetime.min.time(), tz).timestamp()),
+			int(datetime.combine(end + timedelta(days=1), datetime.min.time(), tz).timestamp()),
+			valute, user)
 
-		all_profit = 0
 
-		for log in db_list:
-			amount = log[0]
+def report_text(report, start, end, valute=None, user=None, tz=TZ):
 
-			data = log[3].split('-')
+	last_day = datetime.fromtimestamp(end, tz).date() - timedelta(days=1)
+	text_return = f'📈 Отчет с {datetime.fromtimestamp(start, tz):%d.%m.%Y} по {last_day:%d.%m.%Y}'
 
-			if name == log[2]:
+	if valute is not None:
+		text_return += f'\nВалюта: {valute}'
 
-				all_profit += float(amount)
+	if user is not None:
+		text_return += f'\nПользователь: {user}'
 
-			else:
-				pass
+	if not report:
+		return text_return + '\n\nСделок нет'
+
+	text_return += '\n'
+
+	for name, profit, deals, average in report:
 
 		text_return += f'''
-{name}: {all_profit}'''		
-		
+{name}: {profit} ({deals} сделок, средний чек {round(average, 2)})'''
+
+	text_return += f'''
+
+Итого: {sum(log[1] for log in report)} ({sum(log[2] for log in report)} сделок)'''
 
 	return text_return
 
 
+def analytics_text(weekday, daily, top):
+
+	#weekday: {обмен: [Пн..Вс]}, daily: [(дата, за день, за 7 дней)], top: [(id, оборот, сделок)]
+	text_return = '🧮 Объем по дням недели:'
+
+	for name, sums in weekday.items():
+
+		text_return += f'''
+{name}: {' | '.join(f'{day} {round(total, 2)}' for day, total in zip(('Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс'), sums))}'''
+
+	text_return += '\n\n📅 Последние 7 дней (за день / скользящие 7 дней):'
+
+	for day, total, rolling in daily:
 
-def custom_stat_func(db_list, time):
+		text_return += f'''
+{day:%d.%m}: {round(total, 2)} / {round(rolling, 2)}'''
 
-	dt_now = f'{str(date.today())}-{datetime.datetime.today().isocalendar()[1]}'.split('-')
+	text_return += '\n\n🏆 Топ пользователей по обороту:'
 
-	name_staff = []
+	for user, turnover, deals in top:
 
-	for log in db_list:
+		text_return += f'''
+{user}: {round(turnover, 2)} ({deals} сделок)'''
 
-		name_staff.append(log[2])
+	return text_return
 
-	clear_name_staff = list(set(name_staff))
 
-	text_return = ''
+DURATION_TITLES = {
+	'approve': 'до одобрения',
+	'pay': 'до оплаты',
+	'complete': 'до завершения',
+}
 
-	if time == 'week':
-		text_return += '➕За неделю:'
-		for name in clear_name_staff:
 
-			week = 0
-			day = 0
-			month = 0
+def format_duration(seconds):
 
-			for log in db_list:
-				amount = log[0]
+	minutes, seconds = divmod(int(seconds), 60)
+	hours, minutes = divmod(minutes, 60)
 
-				data = log[3].split('-')
+	if hours:
+		return f'{hours}ч {minutes}м'
 
-				if name == log[2]:
+	return f'{minutes}м {seconds}с' if minutes else f'{seconds}с'
 
-					if str(data[3]) == dt_now[3]:
 
-						week += float(amount)
-					else:
-						pass
+def deal_times_text(durations, days, percentile):
 
-				else:
-					pass
+	#durations: {пара: {'approve': [секунды по возрастанию], ...}}
+	text_return = f'⏱ Время сделок за {days} дн. (p50 / p90 / p99):'
 
-			text_return += f'''
-	{name}: {week}'''		
+	if not durations:
+		return text_return + '\n\nЗавершенных этапов нет'
 
+	for pair, stages in sorted(durations.items()):
 
-		return text_return
+		text_return += f'\n\n🔄 {pair.replace("_", " → ")}'
 
-	elif time == 'day':
-		text_return += f'➕За день:'
-		for name in clear_name_staff:
-			day = 0			
-			for log in db_list:
-				amount = log[0]
+		for name, title in DURATION_TITLES.items():
 
-				data = log[3].split('-')
+			values = stages.get(name)
 
-				if name == log[2]:
+			if values:
+				text_return += f'''
+{title}: {' / '.join(format_duration(percentile(values, p)) for p in (50, 90, 99))} ({len(values)} сделок)'''
+
+	return text_return
 
-					if str(data[2]) == dt_now[2]:
 
-						day += float(amount)
-					else:
-						pass
+def all_stat(profit_list):
 
-				else:
-					pass
+	#profit_list: [(название обмена, сумма), ...]
+	text_return = '➕ Профит: '
 
-			text_return += f'''
-	{name}: {day}'''		
+	for name, profit in profit_list:
 
-		return text_return
+		text_return += f'''
+{name}: {profit}'''
 
-	elif time == 'month':
-		text_return += f'➕За месяц:'
-		for name in clear_name_staff:
-			month = 0			
-			for log in db_list:
-				amount = log[0]
+	return text_return
 
-				data = log[3].split('-')
 
-				if name == log[2]:
 
-					if str(data[1]) == dt_now[1]:
+def custom_stat_func(profit_list, time):
 
-						month += float(amount)
-					else:
-						pass
+	text_return = PERIOD_TITLES[time]
 
-				else:
-					pass
+	for name, profit in profit_list:
 
-			text_return += f'''
-	{name}: {month}'''		
+		text_return += f'''
+	{name}: {profit}'''
 
-		return text_return
\ No newline at end of file
+	return text_return